@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+# Rows/second for recording an upload batch: one transaction per file against one bulk INSERT.
+# Runs on a local SQLite (aiosqlite) database, or on any DATABASE_URL already set.
+# Usage: python -m benchmarks.bulk_insert --rows 500 --batches 5
+os.environ.setdefault("DATABASE_URL", "sqlite:///bulk_insert_benchmark.sqlite3")
+
+from sqlalchemy import insert, delete
+from endpoints.database import engine, AsyncSessionLocal
+from endpoints.models import Base, Users, Documents
+
+
+def document_rows(user_id, count):
+    timestamp = datetime.utcnow()
+    return [{
+        "user_id": user_id,
+        "category": None,
+        "is_important": False,
+        "is_deleted": False,
+        "document_url": f"https://bucket/benchmark/{n}_scan{n}.pdf",
+        "chat_name": None,
+        "doctype": "pdf",
+        "foldername": "benchmark",
+        "timestamp": timestamp,
+    } for n in range(count)]
+
+
+# The old path: add, commit and refresh every file
+async def per_row(user_id, count):
+    async with AsyncSessionLocal() as db:
+        for row in document_rows(user_id, count):
+            document = Documents(**row)
+            db.add(document)
+            await db.commit()
+            await db.refresh(document)
+
+
+async def bulk(user_id, count):
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Documents), document_rows(user_id, count))
+        await db.commit()
+
+
+async def run(rows, batches):
+    async with AsyncSessionLocal() as db:
+        user = Users(email=f"bulk{time.time_ns()}@example.com", password="x", user_type="user")
+        db.add(user)
+        await db.commit()
+        user_id = user.user_id
+
+    for name, insert_batch in (("per-row commit", per_row), ("bulk insert", bulk)):
+        start = time.perf_counter()
+        for _ in range(batches):
+            await insert_batch(user_id, rows)
+        elapsed = time.perf_counter() - start
+        print(f"{name:15s} {rows * batches} rows in {elapsed:.2f}s  {rows * batches / elapsed:10.1f} rows/s")
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Documents).where(Documents.user_id == user_id))
+        await db.execute(delete(Users).where(Users.user_id == user_id))
+        await db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch document inserts")
+    parser.add_argument("--rows", type=int, default=500, help="Files per upload batch")
+    parser.add_argument("--batches", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(run(args.rows, args.batches))
@@ -0,0 +1,49 @@
+import argparse
+import time
+from rag.embedding_cache import CachedEmbeddings
+from rag.embeddings import embedder, cache_namespace
+from rag.local_classifier import CentroidClassifier, load_samples
+
+# Leave-one-out accuracy and latency of the local centroid classifier on the labelled
+# sample set, optionally against the LLM classifier. Centroids are fitted through an in-memory
+# embedding cache so every sample is encoded once, predictions go to the raw encoder so their
+# latency is not a cache hit.
+# Usage: python -m benchmarks.classifier [--samples path.json] [--with-llm]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local document classifier")
+    parser.add_argument("--samples", help="Labelled samples, defaults to rag/data/category_samples.json")
+    parser.add_argument("--with-llm", action="store_true", help="Also time the Claude classifier")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples) if args.samples else load_samples()
+    fit_embeddings = CachedEmbeddings(embedder, cache_namespace, path="")
+    correct = confident = confident_correct = 0
+    latencies = []
+
+    for n, sample in enumerate(samples):
+        classifier = CentroidClassifier(fit_embeddings, samples[:n] + samples[n + 1:])
+        classifier.fit()
+        classifier.embeddings = embedder
+
+        start = time.perf_counter()
+        category, is_confident = classifier.predict(sample["text"])
+        latencies.append(time.perf_counter() - start)
+
+        correct += category == sample["category"]
+        confident += is_confident
+        confident_correct += is_confident and category == sample["category"]
+
+    print(f"local: accuracy {correct / len(samples):.3f}  "
+          f"confident {confident}/{len(samples)} (accuracy {confident_correct / max(confident, 1):.3f})  "
+          f"mean latency {1000 * sum(latencies) / len(latencies):.1f} ms")
+
+    if args.with_llm:
+        from rag.category import classify_with_llm
+
+        correct = 0
+        start = time.perf_counter()
+        for sample in samples:
+            correct += classify_with_llm(sample["text"]) == sample["category"]
+        elapsed = time.perf_counter() - start
+        print(f"llm:   accuracy {correct / len(samples):.3f}  mean latency {1000 * elapsed / len(samples):.1f} ms")
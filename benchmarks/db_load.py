@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+# Concurrent request throughput of the listing endpoints on a local SQLite (aiosqlite)
+# database, or on any DATABASE_URL already set in the environment.
+# Usage: python -m benchmarks.db_load --users 20 --documents 200 --requests 2000 --concurrency 50
+os.environ.setdefault("DATABASE_URL", "sqlite:///db_load_benchmark.sqlite3")
+
+import httpx
+from endpoints.database import engine, SessionLocal
+from endpoints.models import Base, Users, Documents
+from endpoints.main import app
+
+
+def seed(users, documents_per_user):
+    db = SessionLocal()
+    try:
+        if db.query(Users).count() >= users:
+            return
+        now = datetime.utcnow()
+        for n in range(users):
+            user = Users(email=f"load{n}@example.com", password="x", user_type="user")
+            db.add(user)
+            db.flush()
+            db.add_all([
+                Documents(
+                    user_id=user.user_id,
+                    category="Finance",
+                    document_url=f"https://bucket/documents/{n}-{d}_statement{d}.pdf",
+                    doctype="pdf",
+                    foldername=f"folder{d % 5}",
+                    timestamp=now - timedelta(minutes=d),
+                )
+                for d in range(documents_per_user)
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(users, total_requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def one(n):
+            async with semaphore:
+                user_id = n % users + 1
+                path = f"/user/{user_id}/documents" if n % 2 else f"/user/{user_id}/folders"
+                response = await client.get(path)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(total_requests)))
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the async database layer")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    seed(args.users, args.documents)
+    elapsed = asyncio.run(run(args.users, args.requests, args.concurrency))
+    print(f"{args.requests} requests at concurrency {args.concurrency}: {elapsed:.2f}s, "
+          f"{args.requests / elapsed:.1f} req/s")
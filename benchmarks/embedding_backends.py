@@ -0,0 +1,61 @@
+import argparse
+import time
+import numpy as np
+from rag.embeddings import load_embedder
+
+# Compare embedding backends on latency and on how well their nearest neighbours agree
+# with the PyTorch backend. Usage: python -m benchmarks.embedding_backends --backends torch onnx onnx-int8
+
+TOPICS = [
+    "invoice {n} total amount due is {n}.75 USD payable within 30 days",
+    "insurance policy number POL-{n} covers hospital stays up to {n}000 dollars",
+    "electricity bill for meter {n} shows usage of {n} kWh this month",
+    "hotel reservation {n} for two nights, check-in at 3 pm, room {n}",
+    "lab report {n}: haemoglobin level within normal range, follow up in {n} weeks",
+    "lease agreement clause {n}: tenant must give {n} days written notice",
+    "bank statement account {n}: closing balance {n}.20, interest credited",
+    "retail receipt {n}: 3 items purchased, card ending {n}, no returns after 14 days",
+]
+
+def build_corpus(size):
+    return [TOPICS[n % len(TOPICS)].format(n=n) for n in range(size)]
+
+def top_k(vectors, queries, k):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.corpus_size)
+    queries = [text.replace("is", "was") for text in corpus[:args.queries]]
+
+    reference = None
+    for backend in args.backends:
+        embedder = load_embedder(backend)
+        embedder.embed_documents(corpus[:32])  # warm up
+
+        start = time.perf_counter()
+        vectors = embedder.embed_documents(corpus)
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        query_vectors = [embedder.embed_query(query) for query in queries]
+        query_latency_ms = 1000 * (time.perf_counter() - start) / len(queries)
+
+        neighbours = top_k(vectors, query_vectors, args.k)
+        if reference is None:
+            reference = neighbours
+        recall = np.mean([len(a & b) / args.k for a, b in zip(neighbours, reference)])
+
+        print(f"{backend:10s} {len(corpus) / elapsed:8.1f} texts/s  query {query_latency_ms:6.2f} ms  "
+              f"recall@{args.k} vs {args.backends[0]}: {recall:.3f}")
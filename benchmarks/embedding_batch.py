@@ -0,0 +1,54 @@
+import argparse
+import time
+import qdrant_client
+from qdrant_client.http import models
+from langchain_community.vectorstores import Qdrant
+from langchain_text_splitters import CharacterTextSplitter
+from rag.embeddings import embedder, QDRANT_UPSERT_BATCH_SIZE
+
+# Compare chunks/second of per-chunk add_texts against batched ingestion
+# on an in-memory Qdrant. Both passes use the raw encoder, not the embedding cache, so the
+# second pass is not served from vectors the first one computed. Usage: python -m benchmarks.embedding_batch [document.txt]
+
+SAMPLE_PARAGRAPH = (
+    "Invoice 2024-{n:05d} issued to account {n:07d}. The policy holder agrees to pay the "
+    "outstanding balance of {n}.50 USD within thirty days of the statement date. Late "
+    "payments accrue interest at the rate stated in section {n} of the agreement.\n"
+)
+
+def load_document(path):
+    if path:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            return file.read()
+    return "".join(SAMPLE_PARAGRAPH.format(n=n) for n in range(5000))
+
+def fresh_store(client, name):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
+    )
+    return Qdrant(client=client, collection_name=name, embeddings=embedder)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched embedding writes")
+    parser.add_argument("document", nargs="?")
+    parser.add_argument("--batch-size", type=int, default=QDRANT_UPSERT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=1000, chunk_overlap=200, length_function=len)
+    chunks = text_splitter.split_text(load_document(args.document))
+    client = qdrant_client.QdrantClient(":memory:")
+    print(f"{len(chunks)} chunks")
+
+    store = fresh_store(client, "per_chunk")
+    start = time.perf_counter()
+    for chunk in chunks:
+        store.add_texts([chunk])
+    per_chunk = len(chunks) / (time.perf_counter() - start)
+    print(f"per-chunk: {per_chunk:8.1f} chunks/s")
+
+    store = fresh_store(client, "batched")
+    start = time.perf_counter()
+    store.add_texts(chunks, batch_size=args.batch_size)
+    batched = len(chunks) / (time.perf_counter() - start)
+    print(f"batched:   {batched:8.1f} chunks/s  (batch_size={args.batch_size}, x{batched / per_chunk:.1f})")
@@ -0,0 +1,31 @@
+import argparse
+import os
+import time
+from ocr.pdf_image import convert_pdf_to_images
+from ocr.run import extract_text_with_pytesseract
+
+# Measure OCR pages/second on a sample PDF for increasing worker counts
+# Usage: python -m benchmarks.ocr_parallel sample.pdf --workers 1 2 4 8 16
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel page OCR")
+    parser.add_argument("pdf_path")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    images = convert_pdf_to_images(args.pdf_path)
+    print(f"Rendered {len(images)} pages from {args.pdf_path}")
+
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        # Warm the pool so process start-up is not counted against the run
+        extract_text_with_pytesseract(images[:workers], workers=workers)
+
+        start = time.perf_counter()
+        extract_text_with_pytesseract(images, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        pages_per_second = len(images) / elapsed
+        baseline = baseline or pages_per_second
+        print(f"workers={workers:3d}  {elapsed:8.2f}s  {pages_per_second:7.2f} pages/s  "
+              f"speedup x{pages_per_second / baseline:.2f}")
@@ -0,0 +1,155 @@
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+# Seeds a local database with a million documents and prints the query plan and latency of
+# every endpoint query, with the secondary indexes and, with --compare, without them. The
+# statements are built with the endpoints' own helpers: keyset pages (first and a deep one),
+# the GROUP BY counts and the summary table reads.
+# Runs on SQLite by default, or on any DATABASE_URL already set (use a scratch database).
+# Usage: python -m benchmarks.query_plans --documents 1000000 --users 1000 [--compare]
+os.environ.setdefault("DATABASE_URL", "sqlite:///query_plan_benchmark.sqlite3")
+
+from sqlalchemy import func, insert, select, text
+from endpoints.database import engine
+from endpoints.models import Base, Users, Documents, Chats, DocumentSummaries
+from endpoints.pagination import keyset_page, encode_cursor
+from endpoints.search import filename_search_query
+from endpoints.summary import aggregate_query, dimension_column, rebuild_summaries, summary_query, FOLDER, CATEGORY
+
+CATEGORIES = ["Finance", "Legal", "Medical", "Education", "Personal", "Work"]
+
+
+def seed(documents, users, chunk_size=50000):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        seeded = connection.execute(select(func.count()).select_from(Documents)).scalar()
+        if seeded:
+            print(f"using the {seeded} documents already seeded")
+            if not connection.execute(select(func.count()).select_from(DocumentSummaries)).scalar():
+                rebuild_summaries(connection)
+            return
+        connection.execute(insert(Users), [
+            {"email": f"plan{n}@example.com", "password": "x", "user_type": "user"} for n in range(users)
+        ])
+        connection.execute(insert(Chats), [
+            {"chat_name": f"chat{n % 20}", "query": "q", "response": "r", "user_id": n % users + 1,
+             "timestamp": datetime(2024, 1, 1) + timedelta(minutes=n)}
+            for n in range(users * 50)
+        ])
+
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1)
+    for offset in range(0, documents, chunk_size):
+        rows = []
+        for n in range(offset, min(offset + chunk_size, documents)):
+            rows.append({
+                "user_id": rng.randint(1, users),
+                "category": rng.choice(CATEGORIES),
+                "is_important": rng.random() < 0.05,
+                "is_deleted": rng.random() < 0.03,
+                "document_url": f"https://bucket.s3.region.amazonaws.com/documents/{n:08d}_scan{n}.pdf",
+                "chat_name": f"chat{n % 20}" if rng.random() < 0.2 else None,
+                "doctype": "pdf",
+                "foldername": f"folder{rng.randint(0, 30)}" if rng.random() < 0.5 else None,
+                "timestamp": start + timedelta(seconds=n * 60),
+                "original_filename": f"scan{n}.pdf",
+            })
+        with engine.begin() as connection:
+            connection.execute(insert(Documents), rows)
+        print(f"seeded {offset + len(rows)} documents", flush=True)
+
+    with engine.begin() as connection:
+        rebuild_summaries(connection)
+
+
+def document_page(*conditions, cursor=None):
+    return keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(*conditions),
+                       Documents.timestamp, Documents.doc_id, cursor, None)
+
+
+def chat_page(user_id, cursor=None):
+    latest_timestamp = func.min(Chats.timestamp).label("latest_timestamp")
+    return keyset_page(select(Chats.chat_name, latest_timestamp).where(Chats.user_id == user_id)
+                       .group_by(Chats.chat_name), latest_timestamp, Chats.chat_name, cursor, None, having=True)
+
+
+# The statements the endpoints run, for one user
+def endpoint_queries(user_id):
+    # Resumes a listing two years into the seeded range, as a client paging far back would
+    deep_cursor = encode_cursor(datetime(2021, 1, 1), 2 ** 31)
+    return {
+        "login": select(Users).where(Users.email == f"plan{user_id - 1}@example.com"),
+        "documents": document_page(Documents.user_id == user_id, Documents.timestamp <= datetime.utcnow()),
+        "documents_deep": document_page(Documents.user_id == user_id, Documents.timestamp <= datetime.utcnow(),
+                                        cursor=deep_cursor),
+        "category": document_page(Documents.user_id == user_id, Documents.category == "Finance"),
+        "folder": document_page(Documents.user_id == user_id, Documents.foldername == "folder7"),
+        "important": document_page(Documents.user_id == user_id, Documents.is_important == True),
+        "trash": document_page(Documents.user_id == user_id, Documents.is_deleted == True),
+        "folders_grouped": aggregate_query(user_id, dimension_column(FOLDER)),
+        "categories_grouped": aggregate_query(user_id, dimension_column(CATEGORY)),
+        "summary_grouped": aggregate_query(user_id),
+        "folders_table": summary_query(user_id, FOLDER),
+        "categories_table": summary_query(user_id, CATEGORY),
+        "summary_table": summary_query(user_id),
+        "by_url": select(Documents).where(
+            Documents.user_id == user_id,
+            Documents.document_url == "https://bucket.s3.region.amazonaws.com/documents/00000042_scan42.pdf"),
+        "prev_chats": chat_page(user_id),
+        "chat_history": select(Chats).where(Chats.user_id == user_id, Chats.chat_name == "chat3")
+            .order_by(Chats.timestamp.asc()),
+        "filename_search": filename_search_query(engine.dialect.name, user_id, "scan42", 50),
+        "chat_documents": select(Documents).where(Documents.user_id == user_id, Documents.chat_name == "chat3")
+            .order_by(Documents.timestamp.asc()),
+    }
+
+
+def explain(connection, statement):
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    return [" | ".join(str(value) for value in row) for row in connection.execute(text(prefix + sql))]
+
+
+def run(user_id, repeat, show_plans):
+    with engine.connect() as connection:
+        for name, statement in endpoint_queries(user_id).items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                rows = connection.execute(statement).all()
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"  {name:18s} {1000 * elapsed:9.2f} ms  {len(rows):6d} rows")
+            if show_plans:
+                for line in explain(connection, statement):
+                    print(f"      {line}")
+
+
+def secondary_indexes():
+    return [index for table in (Users.__table__, Documents.__table__, Chats.__table__) for index in table.indexes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query plans and latency of the endpoint queries")
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", action="store_true", help="Also run without the secondary indexes")
+    args = parser.parse_args()
+
+    seed(args.documents, args.users)
+    user_id = args.users // 2
+
+    print("with indexes")
+    run(user_id, args.repeat, show_plans=True)
+
+    if args.compare:
+        for index in secondary_indexes():
+            index.drop(bind=engine)
+        try:
+            print("without indexes")
+            run(user_id, args.repeat, show_plans=True)
+        finally:
+            for index in secondary_indexes():
+                index.create(bind=engine)
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import os
+import time
+from io import BytesIO
+from uuid import uuid4
+
+# Upload throughput of the old upload-then-copy_object path against the single-put,
+# concurrent uploader. Runs against a local S3 stand-in, e.g. `moto_server -p 5000`.
+# Usage: python -m benchmarks.s3_upload --endpoint http://localhost:5000 --files 32 --size-kb 512
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark S3 uploads")
+    parser.add_argument("--endpoint", default=os.getenv("S3_ENDPOINT_URL", "http://localhost:5000"))
+    parser.add_argument("--bucket", default="dms-benchmark")
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--size-kb", type=int, default=512)
+    args = parser.parse_args()
+
+    # The storage module reads its settings on import
+    os.environ["S3_ENDPOINT_URL"] = args.endpoint
+    os.environ["S3_BUCKET"] = args.bucket
+    os.environ.setdefault("S3_REGION", "us-east-1")
+    os.environ.setdefault("S3_ACCESS_KEY", "testing")
+    os.environ.setdefault("S3_SECRET_KEY", "testing")
+    from endpoints import storage
+
+    storage.s3.create_bucket(Bucket=args.bucket)
+    payload = os.urandom(args.size_kb * 1024)
+    content_type = "application/pdf"
+
+    start = time.perf_counter()
+    for _ in range(args.files):
+        file_key = f"documents/{uuid4()}_old.pdf"
+        storage.s3.upload_fileobj(BytesIO(payload), args.bucket, file_key)
+        storage.s3.copy_object(
+            Bucket=args.bucket,
+            CopySource={"Bucket": args.bucket, "Key": file_key},
+            Key=file_key,
+            MetadataDirective="REPLACE",
+            ContentDisposition="inline",
+            ContentType=content_type,
+        )
+    sequential = time.perf_counter() - start
+
+    uploads = [(BytesIO(payload), f"documents/{uuid4()}_new.pdf", content_type) for _ in range(args.files)]
+    start = time.perf_counter()
+    errors = [result for result in asyncio.run(storage.upload_batch(uploads)) if isinstance(result, Exception)]
+    concurrent = time.perf_counter() - start
+
+    head = storage.s3.head_object(Bucket=args.bucket, Key=uploads[0][1])
+    assert head["ContentType"] == content_type and head["ContentDisposition"] == "inline"
+
+    megabytes = args.files * args.size_kb / 1024
+    print(f"upload + copy_object, sequential: {sequential:.2f}s  {megabytes / sequential:.1f} MB/s")
+    print(f"single put, {storage.S3_UPLOAD_CONCURRENCY} concurrent: {concurrent:.2f}s  "
+          f"{megabytes / concurrent:.1f} MB/s  ({len(errors)} errors)")
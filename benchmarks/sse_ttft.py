@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("QDRANT_HOST", ":memory:")
+
+import httpx
+import rag.llm
+import endpoints.main
+from endpoints.main import app
+from tests.fakes import FakeSession, FakeStream, FakeStreamingLLM, recording_app
+
+# Measure time-to-first-event and total time of POST /chat/stream, SSE framing and the
+# StreamingResponse included, against a fake streaming LLM so no Anthropic key, Qdrant server
+# or database is needed. Importing the app still loads the embedding model. httpx's
+# ASGITransport returns the body only once the app is done, so send times are taken at the
+# ASGI interface.
+# The fakes are shared with tests/test_chat_stream.py.
+# Usage: python -m benchmarks.sse_ttft --first-token-ms 400 --token-ms 25 --tokens 200
+
+
+async def post_chat_stream(asgi_app):
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        return await client.post("/chat/stream", data={"chat_name": "benchmark", "user_id": 1,
+                                                       "query": "what is the total?"})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-event of POST /chat/stream")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=25)
+    args = parser.parse_args()
+
+    endpoints.main.chat_exists = lambda chat_name, user_id=None: True
+    endpoints.main.SessionLocal = FakeSession
+    rag.llm.retrieve_context = lambda chat_name, query_vector, *args, **kwargs: "fixture context"
+    rag.llm.cached_answer = lambda *args: (None, None, None)
+    rag.llm.llm = FakeStreamingLLM(FakeStream([f"tok{n} " for n in range(args.tokens)],
+                                              args.first_token_ms / 1000, args.token_ms / 1000))
+
+    sent = []
+    start = time.perf_counter()
+    response = asyncio.run(post_chat_stream(recording_app(app, sent)))
+    total = time.perf_counter() - start
+
+    events = response.text.count("event: token")
+    print(f"status={response.status_code}  token events={events}  "
+          f"time-to-first-event={(sent[0][0] - start) * 1000:.1f} ms  total={total * 1000:.1f} ms  "
+          f"(a blocking endpoint sends nothing before the total)")
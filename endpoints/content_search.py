@@ -0,0 +1,110 @@
+import html
+import os
+import re
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.dialects.mysql import match
+from endpoints.models import Documents, DocumentPages
+from endpoints.pagination import page_size
+
+# Language configuration of the PostgreSQL tsvector index, migration 0005 builds the index
+# with the same value
+CONTENT_SEARCH_LANGUAGE = os.getenv("CONTENT_SEARCH_LANGUAGE", "english")
+if not CONTENT_SEARCH_LANGUAGE.isidentifier():
+    raise ValueError(f"Invalid CONTENT_SEARCH_LANGUAGE: {CONTENT_SEARCH_LANGUAGE}")
+# Words of context around the matches in a snippet
+SNIPPET_WORDS = int(os.getenv("SNIPPET_WORDS", "30"))
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+ELLIPSIS = "…"
+# The highlighters mark matches with control characters, the page text is HTML-escaped
+# before they become <mark> tags so OCR text can never inject markup
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+WORD = re.compile(r"\w+")
+
+REGCONFIG = literal_column(f"'{CONTENT_SEARCH_LANGUAGE}'::regconfig")
+# The SQLite FTS5 table created by migration 0005, its rowid is document_pages.page_id
+document_pages_fts = table("document_pages_fts", column("rowid"))
+
+
+def query_terms(query):
+    return WORD.findall(query.lower())
+
+
+# FTS5 parses its own query language, quote every term so user input is matched literally
+def fts5_query(query):
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query_terms(query))
+
+
+# Escape a highlighted snippet for HTML and turn its match markers into <mark> tags
+def render_snippet(snippet):
+    return html.escape(snippet).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+# Window of the page text around the first matching term, matches wrapped in <mark> and the
+# rest escaped. Used where the database has no highlighter of its own (MySQL)
+def highlight_snippet(page_text, query, words=SNIPPET_WORDS):
+    terms = set(query_terms(query))
+    tokens = page_text.replace(MATCH_START, "").replace(MATCH_END, "").split()
+    first = next((n for n, token in enumerate(tokens) if terms & set(WORD.findall(token.lower()))), 0)
+    start = max(0, first - words // 3)
+    window = tokens[start:start + words]
+
+    def mark(token):
+        return WORD.sub(lambda m: f"{MATCH_START}{m.group(0)}{MATCH_END}"
+                        if m.group(0).lower() in terms else m.group(0), token)
+
+    snippet = " ".join(mark(token) for token in window)
+    if start > 0:
+        snippet = ELLIPSIS + snippet
+    if start + words < len(tokens):
+        snippet += ELLIPSIS
+    return render_snippet(snippet)
+
+
+# Ranked page matches for one user, best first:
+#   PostgreSQL: websearch_to_tsquery against the tsvector expression index, ts_rank, ts_headline
+#   MySQL: MATCH ... AGAINST on the FULLTEXT index, snippets are highlighted afterwards
+#   SQLite: the FTS5 table, bm25 and snippet()
+# Rows carry document_url, timestamp, filename, page_number, score and snippet, on MySQL
+# page_text instead of snippet. Snippets carry MATCH_START/MATCH_END markers, pass them
+# through render_snippet
+def content_search_query(dialect_name, user_id, query, limit, offset=0):
+    columns = [Documents.document_url, Documents.timestamp, Documents.original_filename.label("filename"),
+               DocumentPages.page_number]
+
+    if dialect_name == "postgresql":
+        vector = func.to_tsvector(REGCONFIG, DocumentPages.text)
+        tsquery = func.websearch_to_tsquery(REGCONFIG, query)
+        score = func.ts_rank(vector, tsquery)
+        snippet = func.ts_headline(
+            REGCONFIG, DocumentPages.text, tsquery,
+            f"StartSel=\"{MATCH_START}\", StopSel=\"{MATCH_END}\", MaxWords={SNIPPET_WORDS}, "
+            f"MinWords={SNIPPET_WORDS // 2}, MaxFragments=2, FragmentDelimiter=\" {ELLIPSIS} \"",
+        )
+        statement = select(*columns, score.label("score"), snippet.label("snippet")).where(vector.op("@@")(tsquery))
+    elif dialect_name == "mysql":
+        score = match(DocumentPages.text, against=query).in_natural_language_mode()
+        statement = select(*columns, score.label("score"), DocumentPages.text.label("page_text")).where(score > 0)
+    else:
+        # bm25() is lower for better matches, negate it so every backend sorts by score descending
+        score = -func.bm25(literal_column("document_pages_fts"))
+        snippet = func.snippet(literal_column("document_pages_fts"), 0, MATCH_START, MATCH_END,
+                               ELLIPSIS, min(SNIPPET_WORDS, 64))
+        statement = (
+            select(*columns, score.label("score"), snippet.label("snippet"))
+            .select_from(DocumentPages)
+            .join(document_pages_fts, document_pages_fts.c.rowid == DocumentPages.page_id)
+            .where(literal_column("document_pages_fts").op("MATCH")(fts5_query(query)))
+        )
+
+    return (
+        statement
+        .join_from(DocumentPages, Documents, DocumentPages.doc_id == Documents.doc_id)
+        .where(Documents.user_id == user_id, Documents.is_deleted.isnot(True))
+        .order_by(literal_column("score").desc(), Documents.timestamp.desc(), DocumentPages.page_id)
+        .limit(page_size(limit))
+        .offset(offset)
+    )
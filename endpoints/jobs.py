@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+from botocore.exceptions import ClientError
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from endpoints.models import Jobs, Documents, Chats, DocumentPages
+from endpoints.storage import download_file, document_url, filename_from_key
+from endpoints.summary import update_summaries, summary_rows
+from ocr.run import process_file_pages, UnsupportedDocument
+from rag.embeddings import handle_chat_embeddings, embeddings
+from rag.llm import query_llm
+from rag.category import aclassify_document_content, DEFAULT_CATEGORY
+from rag.qdrant_utils import assign_document, chat_exists
+from rag.chatname import acreate_chat_name
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = int(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "30"))
+
+# Raised on purpose by a job handler for a failure that would repeat on every attempt
+class PermanentJobError(Exception):
+    pass
+
+# Failures that are not retried: the ones raised on purpose, documents OCR cannot read and
+# objects missing from S3. Everything else, code bugs included, is retried until max_attempts
+PERMANENT_ERRORS = (PermanentJobError, UnsupportedDocument)
+MISSING_OBJECT_CODES = {"404", "NoSuchKey", "NotFound"}
+
+# Job kinds and the ordered stages each one reports while it runs. Classification runs
+# concurrently with the later stages and is only awaited at its "classify" step
+INITIALIZE_CHAT = "initialize_chat"
+ADD_TO_COLLECTION = "add_to_collection"
+
+JOB_STAGES = {
+    INITIALIZE_CHAT: ["download", "ocr", "chat_name", "embeddings", "answer", "classify", "save"],
+    ADD_TO_COLLECTION: ["download", "ocr", "embeddings", "classify", "save"],
+}
+
+_event_loop = None
+_event_loop_pid = None
+
+# The async Anthropic clients keep connections bound to one event loop, so each worker
+# process runs all its jobs on a single long-lived loop
+def run_async(coro):
+    global _event_loop, _event_loop_pid
+    if _event_loop is None or _event_loop_pid != os.getpid():
+        _event_loop = asyncio.new_event_loop()
+        _event_loop_pid = os.getpid()
+    return _event_loop.run_until_complete(coro)
+
+
+# Function to queue a new ingestion job, returns the job id
+async def enqueue_job(db: AsyncSession, user_id: int, kind: str, payload: dict) -> str:
+    job = Jobs(
+        job_id=str(uuid4()),
+        user_id=user_id,
+        kind=kind,
+        status="queued",
+        progress=0,
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        payload=json.dumps(payload),
+        run_after=datetime.utcnow(),
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow(),
+    )
+    db.add(job)
+    await db.commit()
+    return job.job_id
+
+
+# Public view of a job for the status endpoint
+def job_status(job: Jobs) -> dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "attempts": job.attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+
+
+# Persist the stage a running job has reached so clients can poll it. Written through the
+# pipeline's own session, which holds no other pending writes while the stages run: the
+# document is only written at the end, in one short transaction
+def report_stage(db: Session, job: Jobs, stage: str):
+    stages = JOB_STAGES[job.kind]
+    job.stage = stage
+    job.progress = int(100 * stages.index(stage) / len(stages))
+    job.updated_at = datetime.utcnow()
+    db.commit()
+    print(f"Job {job.job_id}: {stage} ({job.progress}%)")
+
+
+# Keep the extracted text page by page with the document, committed with it, for content
+# search and for re-indexing without another OCR pass
+def add_pages(db: Session, document: Documents, page_texts: list):
+    db.add_all([
+        DocumentPages(doc_id=document.doc_id, page_number=number, text=text or "")
+        for number, text in enumerate(page_texts, start=1)
+    ])
+
+
+# Classification is best effort, a failed call files the document under the default category
+# instead of failing a job whose chunks are already indexed
+async def classify_or_default(document_text: str) -> str:
+    try:
+        return await aclassify_document_content(document_text)
+    except Exception as e:
+        print(f"Classification failed, using '{DEFAULT_CATEGORY}': {type(e).__name__}: {e}")
+        return DEFAULT_CATEGORY
+
+
+# Generated names can repeat an existing chat (in the per-chat layout, any user's collection),
+# a numeric suffix keeps the new document out of it
+def unique_chat_name(chat_name: str, user_id: int) -> str:
+    candidate, n = chat_name, 1
+    while chat_exists(candidate, user_id):
+        n += 1
+        candidate = f"{chat_name}_{n}"
+    return candidate
+
+
+# Write the document row and its pages, then stamp its doc_id on the chunks the job indexed.
+# Flushed for the doc_id and committed by the caller right after
+def save_document(db: Session, job: Jobs, payload: dict, chat_name: str, category: str,
+                  page_texts: list) -> Documents:
+    document = Documents(
+        user_id=job.user_id,
+        category=category,
+        is_important=False,
+        is_deleted=False,
+        document_url=document_url(payload["file_key"]),
+        chat_name=chat_name,
+        doctype=payload["doc_type"],
+        foldername=None,
+        timestamp=datetime.utcnow(),
+        original_filename=filename_from_key(payload["file_key"]),
+    )
+    db.add(document)
+    db.flush()
+    add_pages(db, document, page_texts)
+    assign_document(chat_name, job.user_id, job.job_id, document.doc_id)
+    update_summaries(db, summary_rows(document, documents=1))
+    return document
+
+
+# Classification and naming only need the text and run concurrently. Embedding waits
+# for the chat name and answering waits for the embeddings, while classification keeps
+# running in the background until the document row needs its category. The chat name is fixed
+# on the first attempt, chunks are written under ids derived from the job, so a retried job
+# overwrites them rather than adding more
+async def initialize_chat_stages(db: Session, job: Jobs, payload: dict, page_texts: list) -> dict:
+    document_text = "\n".join(page_texts)
+    classify_task = asyncio.create_task(classify_or_default(document_text))
+    try:
+        report_stage(db, job, "chat_name")
+        chat_name = payload.get("chat_name")
+        if not chat_name:
+            chat_name = await acreate_chat_name(document_text, payload["query"])
+            chat_name = await asyncio.to_thread(unique_chat_name, chat_name, job.user_id)
+            # Kept with the job, committed by the next report_stage, so a retry reuses the chat
+            payload["chat_name"] = chat_name
+            job.payload = json.dumps(payload)
+
+        report_stage(db, job, "embeddings")
+        await asyncio.to_thread(handle_chat_embeddings, chat_name, document_text,
+                                user_id=job.user_id, job_id=job.job_id)
+
+        report_stage(db, job, "answer")
+        response = await asyncio.to_thread(query_llm, chat_name, payload["query"], job.user_id)
+
+        report_stage(db, job, "classify")
+        category = await classify_task
+    finally:
+        classify_task.cancel()
+
+    report_stage(db, job, "save")
+    save_document(db, job, payload, chat_name, category, page_texts)
+    db.add(Chats(
+        chat_name=chat_name,
+        query=payload["query"],
+        response=response,
+        timestamp=datetime.utcnow(),
+        user_id=job.user_id
+    ))
+    db.commit()
+    return {"chat_name": chat_name, "initial_response": response}
+
+
+def run_initialize_chat(db: Session, job: Jobs, payload: dict) -> dict:
+    report_stage(db, job, "download")
+    with download_file(payload["file_key"]) as file:
+        report_stage(db, job, "ocr")
+        page_texts = process_file_pages(file, payload["content_type"])
+
+    return run_async(initialize_chat_stages(db, job, payload, page_texts))
+
+
+async def add_to_collection_stages(db: Session, job: Jobs, payload: dict, page_texts: list) -> dict:
+    document_text = "\n".join(page_texts)
+    classify_task = asyncio.create_task(classify_or_default(document_text))
+    try:
+        report_stage(db, job, "embeddings")
+        await asyncio.to_thread(handle_chat_embeddings, payload["chat_name"], document_text,
+                                user_id=job.user_id, job_id=job.job_id)
+
+        report_stage(db, job, "classify")
+        category = await classify_task
+    finally:
+        classify_task.cancel()
+
+    report_stage(db, job, "save")
+    document = save_document(db, job, payload, payload["chat_name"], category, page_texts)
+    db.commit()
+    return {"filename": payload["filename"], "url": document.document_url, "chat_name": payload["chat_name"]}
+
+
+def run_add_to_collection(db: Session, job: Jobs, payload: dict) -> dict:
+    report_stage(db, job, "download")
+    with download_file(payload["file_key"]) as file:
+        report_stage(db, job, "ocr")
+        page_texts = process_file_pages(file, payload["content_type"])
+
+    return run_async(add_to_collection_stages(db, job, payload, page_texts))
+
+
+JOB_HANDLERS = {
+    INITIALIZE_CHAT: run_initialize_chat,
+    ADD_TO_COLLECTION: run_add_to_collection,
+}
+
+
+def is_permanent_error(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in MISSING_OBJECT_CODES
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+# Run a claimed job to completion, re-queueing it with backoff on transient failures
+def run_job(db: Session, job: Jobs):
+    payload = json.loads(job.payload)
+    try:
+        result = JOB_HANDLERS[job.kind](db, job, payload)
+    except Exception as e:
+        db.rollback()
+        job.error = f"{type(e).__name__}: {e}"
+        job.updated_at = datetime.utcnow()
+        if job.attempts < job.max_attempts and not is_permanent_error(e):
+            job.status = "queued"
+            job.run_after = datetime.utcnow() + timedelta(seconds=JOB_RETRY_BACKOFF_SECONDS * job.attempts)
+            print(f"Job {job.job_id} failed at stage '{job.stage}', retrying: {job.error}")
+        else:
+            job.status = "failed"
+            print(f"Job {job.job_id} failed permanently: {job.error}")
+        db.commit()
+        return
+
+    job.status = "completed"
+    job.stage = "done"
+    job.progress = 100
+    job.result = json.dumps(result)
+    job.error = None
+    job.updated_at = datetime.utcnow()
+    db.commit()
+    print(f"Job {job.job_id} completed, embedding cache: {embeddings.metrics()}")
@@ -0,0 +1,53 @@
+import os
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from endpoints.storage import UPLOAD_MAX_FILE_BYTES
+
+# Largest request body accepted, checked before the multipart body is parsed
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+
+
+def too_large(detail):
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+# ASGI middleware rejecting oversized bodies before they are spooled: by Content-Length
+# when the client sends one, otherwise as soon as the streamed body passes the limit
+class RequestSizeLimitMiddleware:
+    def __init__(self, app, max_bytes=UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds {self.max_bytes} bytes"
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised while FastAPI reads the form, it passes HTTPExceptions through
+                    raise too_large(detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# Reject the request before any upload starts when one of its files is over the limit
+def check_file_sizes(files):
+    for file in files:
+        if file.size is not None and file.size > UPLOAD_MAX_FILE_BYTES:
+            raise too_large(f"{file.filename} exceeds {UPLOAD_MAX_FILE_BYTES} bytes")
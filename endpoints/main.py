@@ -1,52 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import UploadFile, File, Form
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from passlib.context import CryptContext
 from sympy.integrals.meijerint_doc import category
-from endpoints.database import get_db, engine
-from endpoints import models
-from endpoints.models import Users, Documents, Chats
-from typing import List, Dict
-from sqlalchemy import func
-import boto3
-from io import BytesIO
+from endpoints.database import get_async_db, SessionLocal, AsyncSessionLocal
+from endpoints.models import Users, Documents, Chats, Jobs
+from typing import List, Dict, Optional
+from sqlalchemy import func, select, insert, update
+from sqlalchemy.exc import SQLAlchemyError
 from uuid import uuid4
 from datetime import datetime
-from ocr.run import process_file
-from rag.embeddings import handle_chat_embeddings
-from rag.llm import query_llm
-from rag.category import classify_document_content
-from rag.qdrant_utils import client, collection_exists
-from rag.chatname import create_chat_name
+from botocore.exceptions import ClientError
+from boto3.exceptions import S3UploadFailedError
+from rag.qdrant_utils import chat_exists, delete_chat_vectors
+from rag.llm import query_llm, query_llm_stream
+from rag.embeddings import embeddings
+from rag.answer_cache import answer_cache
+from endpoints.storage import document_url, upload_file, upload_batch, delete_files, FileTooLarge, UPLOAD_MAX_FILE_BYTES
+from endpoints.pagination import keyset_page, finish_page, DEFAULT_PAGE_SIZE, NEXT_CURSOR_HEADER
+from endpoints.summary import aupdate_summaries, summary_rows, dimension_counts, total_counts, FOLDER, CATEGORY
+from endpoints.search import filename_search_query, similarity_threshold_statement
+from endpoints.content_search import content_search_query, highlight_snippet, render_snippet, query_terms
+from endpoints.limits import RequestSizeLimitMiddleware, check_file_sizes, too_large
+from endpoints.jobs import enqueue_job, job_status, INITIALIZE_CHAT, ADD_TO_COLLECTION
+import asyncio
+import json
 import os
 
 
 app = FastAPI()
 
+# Added first so CORS headers are also set on its 413 responses
+app.add_middleware(RequestSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for testing
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
-models.Base.metadata.create_all(bind=engine)
-S3_BUCKET = os.getenv("S3_BUCKET")
-S3_REGION = os.getenv("S3_REGION")
-S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
-S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
-
-s3 = boto3.client(
-    's3',
-    region_name=S3_REGION,
-    aws_access_key_id=S3_ACCESS_KEY,
-    aws_secret_access_key=S3_SECRET_KEY
-)
-
-
 
 
 MIME_TYPE_MAP = {
@@ -58,6 +55,7 @@ MIME_TYPE_MAP = {
     'image/png': 'png',
 }
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "1"))
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -75,10 +73,30 @@ class FolderCountResponse(BaseModel):
     count: int
     timestamp: str
 
+class CategoryCountResponse(BaseModel):
+    category: str
+    count: int
+    timestamp: str
+
+class DocumentSummaryResponse(BaseModel):
+    documents: int
+    important: int
+    deleted: int
+    latest_timestamp: Optional[str] = None
+
 class DocumentResponse(BaseModel):
     document_url: str
     timestamp: str  # The timestamp will now be returned as a string
 
+class DocumentSearchResponse(DocumentResponse):
+    filename: str
+
+class ContentSearchResponse(DocumentResponse):
+    filename: Optional[str] = None
+    page: int
+    score: float
+    snippet: str
+
 class ChatResponse(BaseModel):
     chat_name: str
     latest_timestamp: str
@@ -120,9 +138,9 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 # Signup endpoint
 @app.post("/signup", response_model=dict)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    existing_user = db.query(Users).filter(Users.email == user.email).first()
+    existing_user = (await db.execute(select(Users).where(Users.email == user.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")
 
@@ -131,18 +149,17 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     new_user = Users(email=user.email, password=hashed_password, user_type=user.user_type)
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {"message": "User created successfully"}
 
 
 @app.post("/login", response_model=dict)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     # Fetch the user by email and user_type
-    db_user = db.query(Users).filter(
+    db_user = (await db.execute(select(Users).where(
         Users.email == user.email,
         Users.user_type == user.user_type
-    ).first()
+    ))).scalars().first()
 
     # Check if user exists and password is correct
     if not db_user or not verify_password(user.password, db_user.password):
@@ -156,15 +173,30 @@ async def login(user: UserLogin, db: Session = Depends(get_db)):
     }
 
 
+# Insert the metadata of an uploaded batch with one bulk INSERT in a single transaction.
+# All or nothing: if it fails no row is kept and the batch's objects are removed from S3
+async def insert_documents(db: AsyncSession, rows: List[dict], file_keys: List[str]):
+    try:
+        await db.execute(insert(Documents), rows)
+        await aupdate_summaries(db, [change for row in rows for change in summary_rows(row, documents=1)])
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        await asyncio.to_thread(delete_files, file_keys)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Saving documents failed")
+
+
 @app.post("/upload_files")
 async def upload_files(
     query_params: FileUploadQueryParams = Depends(),  # Dependency to extract query parameters
     files: List[UploadFile] = File(...),  # List of files in the request body
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     uploaded_files = []
     user_id = query_params.user_id  # Access user_id from query parameters
 
+    # Validate every file before anything is uploaded
+    uploads = []
     for file in files:
         # Generate unique file ID and key
         file_id = str(uuid4())
@@ -175,58 +207,54 @@ async def upload_files(
         doc_type = MIME_TYPE_MAP.get(content_type)
         if not doc_type:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type")
-
-        # Read file content into memory
-        file_content = await file.read()
-
-        # Upload the file to S3
-        try:
-            s3.upload_fileobj(BytesIO(file_content), S3_BUCKET, file_key)
-
-            # Set Content-Disposition and ContentType metadata
-            s3.copy_object(
-                Bucket=S3_BUCKET,
-                CopySource={'Bucket': S3_BUCKET, 'Key': file_key},
-                Key=file_key,
-                MetadataDirective='REPLACE',
-                ContentDisposition='inline',
-                ContentType=content_type
-            )
-
-        except ClientError as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
-
+        uploads.append((file, file_key, content_type, doc_type))
+
+    check_file_sizes(files)
+
+    # Stream the files to S3 concurrently, ContentType and ContentDisposition set in the same put
+    results = await upload_batch([(file.file, file_key, content_type) for file, file_key, content_type, _ in uploads])
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        await asyncio.to_thread(delete_files, [upload[1] for upload, result in zip(uploads, results)
+                                               if not isinstance(result, Exception)])
+        if any(isinstance(error, FileTooLarge) for error in failed):
+            raise too_large("File too large")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
+
+    timestamp = datetime.utcnow()
+    rows = []
+    for (file, file_key, content_type, doc_type), content_hash in zip(uploads, results):
         # Create a public URL for the uploaded file
-        doc_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_key}"
-
-        # Insert file metadata into the database
-        new_document = Documents(
-            user_id=user_id,
-            category=None,
-            is_important=False,
-            is_deleted=False,
-            document_url=doc_url,
-            chat_name=None,
-            doctype=doc_type,
-            foldername=None,
-            timestamp=datetime.utcnow()
-        )
-
-        db.add(new_document)
-        db.commit()
-        db.refresh(new_document)
+        doc_url = document_url(file_key)
+
+        rows.append({
+            "user_id": user_id,
+            "category": None,
+            "is_important": False,
+            "is_deleted": False,
+            "document_url": doc_url,
+            "chat_name": None,
+            "doctype": doc_type,
+            "foldername": None,
+            "timestamp": timestamp,
+            "original_filename": file.filename,
+        })
 
         # Append uploaded file info to the response list
-        uploaded_files.append({"document_url": doc_url, "doctype": doc_type})
+        uploaded_files.append({"document_url": doc_url, "doctype": doc_type, "sha256": content_hash})
+
+    await insert_documents(db, rows, [upload[1] for upload in uploads])
 
     return {"message": "Files uploaded successfully", "uploaded_files": uploaded_files}
 
 
 @app.post("/upload-folder")
 async def upload_folder(user_id: int, foldername: str, files: List[UploadFile] = File(...),
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_async_db)):
     uploaded_files = []
 
+    # Validate every file before anything is uploaded
+    uploads = []
     for file in files:
         # Generate unique file ID and key within the folder
         file_id = str(uuid4())
@@ -237,202 +265,257 @@ async def upload_folder(user_id: int, foldername: str, files: List[UploadFile] =
         doc_type = MIME_TYPE_MAP.get(content_type)
         if not doc_type:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type")
-
-        # Read file content into memory
-        file_content = await file.read()
-
-        # Upload the file to S3
-        try:
-            s3.upload_fileobj(BytesIO(file_content), S3_BUCKET, file_key)
-
-            # Set Content-Disposition and ContentType metadata
-            s3.copy_object(
-                Bucket=S3_BUCKET,
-                CopySource={'Bucket': S3_BUCKET, 'Key': file_key},
-                Key=file_key,
-                MetadataDirective='REPLACE',
-                ContentDisposition='inline',
-                ContentType=content_type
-            )
-
-        except ClientError as e:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
-
+        uploads.append((file, file_key, content_type, doc_type))
+
+    check_file_sizes(files)
+
+    # Stream the files to S3 concurrently, ContentType and ContentDisposition set in the same put
+    results = await upload_batch([(file.file, file_key, content_type) for file, file_key, content_type, _ in uploads])
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        await asyncio.to_thread(delete_files, [upload[1] for upload, result in zip(uploads, results)
+                                               if not isinstance(result, Exception)])
+        if any(isinstance(error, FileTooLarge) for error in failed):
+            raise too_large("File too large")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File upload failed")
+
+    timestamp = datetime.utcnow()
+    rows = []
+    for (file, file_key, content_type, doc_type), content_hash in zip(uploads, results):
         # Create a public URL for the uploaded file
-        doc_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_key}"
-
-        # Insert file metadata into the database
-        new_document = Documents(
-            user_id=user_id,
-            category=None,
-            is_important=False,
-            is_deleted=False,
-            document_url=doc_url,
-            chat_name=None,
-            doctype=doc_type,
-            foldername=foldername,
-            timestamp=datetime.utcnow()
-        )
-
-        db.add(new_document)
-        db.commit()
-        db.refresh(new_document)
+        doc_url = document_url(file_key)
+
+        rows.append({
+            "user_id": user_id,
+            "category": None,
+            "is_important": False,
+            "is_deleted": False,
+            "document_url": doc_url,
+            "chat_name": None,
+            "doctype": doc_type,
+            "foldername": foldername,
+            "timestamp": timestamp,
+            "original_filename": file.filename,
+        })
 
         # Append uploaded file info to the response list
-        uploaded_files.append({"document_url": doc_url, "doctype": doc_type})
+        uploaded_files.append({"document_url": doc_url, "doctype": doc_type, "sha256": content_hash})
+
+    await insert_documents(db, rows, [upload[1] for upload in uploads])
 
     return {"message": "Folder uploaded successfully", "foldername": foldername, "uploaded_files": uploaded_files}
 
 
 @app.get("/user/{user_id}/folders", response_model=List[FolderCountResponse])
-async def get_user_folders(user_id: int, db: Session = Depends(get_db)):
-    # Query all folder names and their timestamps for the given user_id
-    foldernames_with_timestamp = db.query(Documents.foldername, Documents.timestamp).filter(
-        Documents.user_id == user_id
-    ).all()
+async def get_user_folders(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Document count and latest upload per folder, aggregated by the database
+    folders = await dimension_counts(db, user_id, FOLDER)
 
-    if not foldernames_with_timestamp:
+    if not folders:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No folders found for this user")
 
-    # Create a dictionary to count the occurrences of each folder name, along with the latest timestamp
-    folder_count_dict = {}
-
-    for folder, timestamp in foldernames_with_timestamp:
-        if folder:
-            if folder in folder_count_dict:
-                folder_count_dict[folder]["count"] += 1
-            else:
-                folder_count_dict[folder] = {"count": 1, "timestamp": timestamp}
-
-    # Prepare the response by converting the dictionary into a list of FolderCountResponse
+    # Prepare the response as a list of FolderCountResponse
     folder_counts = [
         {
-            "foldername": foldername,
-            "count": data["count"],
-            "timestamp": data["timestamp"].strftime("%B %d, %Y")  # Format the timestamp
+            "foldername": folder.value,
+            "count": folder.documents,
+            "timestamp": folder.latest_timestamp.strftime("%B %d, %Y")  # Format the timestamp
         }
-        for foldername, data in folder_count_dict.items()
+        for folder in folders
     ]
 
     return folder_counts
 
 
+@app.get("/user/{user_id}/categories", response_model=List[CategoryCountResponse])
+async def get_user_categories(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Document count and latest upload per category, aggregated by the database
+    categories = await dimension_counts(db, user_id, CATEGORY)
+
+    if not categories:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No categories found for this user")
+
+    return [
+        {
+            "category": category.value,
+            "count": category.documents,
+            "timestamp": category.latest_timestamp.strftime("%B %d, %Y")
+        }
+        for category in categories
+    ]
+
+
+@app.get("/user/{user_id}/summary", response_model=DocumentSummaryResponse)
+async def get_user_summary(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Totals for the dashboard: all documents, important ones and the ones in the trash
+    totals = await total_counts(db, user_id)
+
+    if not totals or not totals[0]:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No documents found for this user")
+
+    documents, important, deleted, latest_timestamp = totals
+    return {
+        "documents": documents,
+        "important": important,
+        "deleted": deleted,
+        "latest_timestamp": latest_timestamp.strftime("%B %d, %Y") if latest_timestamp else None
+    }
+
 
 @app.get("/user/{user_id}/documents", response_model=List[DocumentResponse])
-async def get_documents_by_timestamp(user_id: int, db: Session = Depends(get_db)):
+async def get_documents_by_timestamp(user_id: int, response: Response, cursor: Optional[str] = None,
+                                     limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
     # Get the current timestamp
     current_timestamp = datetime.utcnow()
 
-    # Query the documents table for document URLs and timestamps, with the specified user_id and timestamp condition
-    documents = db.query(Documents.document_url, Documents.timestamp).filter(
+    # One page of document URLs and timestamps, most recent first; the cursor picks up after the previous page
+    documents = (await db.execute(keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(
         Documents.user_id == user_id,
         Documents.timestamp <= current_timestamp
-    ).order_by(Documents.timestamp.desc()).all()  # Sort by timestamp in descending order (most recent first)
+    ), Documents.timestamp, Documents.doc_id, cursor, limit))).all()
 
     # Check if documents were found
-    if not documents:
+    if not documents and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="No documents found for this user at or after the current timestamp.")
 
     # Prepare the response by converting the result into a list of DocumentResponse objects
     document_responses = [
         {
-            "document_url": doc[0],
-            "timestamp": doc[1].strftime("%B %d, %Y")  # Explicitly format the datetime to string
-        } for doc in documents
+            "document_url": doc.document_url,
+            "timestamp": doc.timestamp.strftime("%B %d, %Y")  # Explicitly format the datetime to string
+        } for doc in finish_page(documents, limit, response)
     ]
 
     return document_responses
 
-@app.get("/search-documents/", response_model=List[DocumentResponse])
-async def search_documents(name: str, user_id: int, db: Session = Depends(get_db)):
-    # Query to get all documents for the specified user
-    results = db.query(Documents.document_url, Documents.timestamp).filter(
-        Documents.user_id == user_id
-    ).all()
-
-    # Filter documents based on the extracted name from `doc_url`
-    matching_docs = []
-    for doc_url, timestamp in results:
-        full_filename = doc_url.split('/')[-1]
-        actual_filename = full_filename.split('_')[-1].split('.')[0]
-
-        if actual_filename.lower() == name.lower():
-            # Format the timestamp
-            formatted_timestamp = timestamp.strftime("%B %d, %Y")
-            matching_docs.append(DocumentResponse(document_url=doc_url, timestamp=formatted_timestamp))
-
-    if not matching_docs:
+@app.get("/search-documents/", response_model=List[DocumentSearchResponse])
+async def search_documents(name: str, user_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = Query(0, ge=0),
+                           db: AsyncSession = Depends(get_async_db)):
+    # Ranked prefix and fuzzy match on the indexed original filename, one page at a time
+    dialect_name = db.bind.dialect.name
+    threshold = similarity_threshold_statement(dialect_name)
+    if threshold is not None:
+        await db.execute(threshold)
+    results = (await db.execute(filename_search_query(dialect_name, user_id, name, limit, offset))).all()
+
+    if not results and not offset:
         raise HTTPException(status_code=404, detail="No documents found with the specified name")
 
-    return matching_docs
+    return [
+        DocumentSearchResponse(
+            document_url=doc.document_url,
+            timestamp=doc.timestamp.strftime("%B %d, %Y"),  # Format the timestamp
+            filename=doc.filename,
+        )
+        for doc in results
+    ]
 
-@app.get("/user/{user_id}/prev_chats", response_model=List[ChatResponse])
-async def get_user_chats(user_id: int, db: Session = Depends(get_db)):
-    # Query all unique chat names and the latest timestamp for each chat for the specified user
-    results = (
-        db.query(Chats.chat_name, func.min(Chats.timestamp).label("latest_timestamp"))
-        .filter(Chats.user_id == user_id)
-        .group_by(Chats.chat_name)
-        .order_by(func.min(Chats.timestamp).desc())
-        .all()
-    )
+@app.get("/search-content/", response_model=List[ContentSearchResponse])
+async def search_content(q: str, user_id: int, limit: int = DEFAULT_PAGE_SIZE, offset: int = Query(0, ge=0),
+                         db: AsyncSession = Depends(get_async_db)):
+    if not query_terms(q):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query has no words")
+
+    # Ranked page matches from the full-text index, with the matching words highlighted
+    dialect_name = db.bind.dialect.name
+    results = (await db.execute(content_search_query(dialect_name, user_id, q, limit, offset))).all()
+
+    if not results and not offset:
+        raise HTTPException(status_code=404, detail="No documents found containing the search terms")
+
+    return [
+        ContentSearchResponse(
+            document_url=hit.document_url,
+            timestamp=hit.timestamp.strftime("%B %d, %Y"),
+            filename=hit.filename,
+            page=hit.page_number,
+            score=float(hit.score),
+            snippet=highlight_snippet(hit.page_text, q) if dialect_name == "mysql" else render_snippet(hit.snippet),
+        )
+        for hit in results
+    ]
 
-    if not results:
+@app.get("/user/{user_id}/prev_chats", response_model=List[ChatResponse])
+async def get_user_chats(user_id: int, response: Response, cursor: Optional[str] = None,
+                         limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
+    # One page of unique chat names with the timestamp of each chat for the specified user
+    latest_timestamp = func.min(Chats.timestamp).label("latest_timestamp")
+    results = (await db.execute(keyset_page(
+        select(Chats.chat_name, latest_timestamp)
+        .where(Chats.user_id == user_id)
+        .group_by(Chats.chat_name),
+        latest_timestamp, Chats.chat_name, cursor, limit, having=True
+    ))).all()
+
+    if not results and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No chats found for this user")
 
     # Prepare the response by formatting each timestamp
     chat_list = []
-    for chat_name, latest_timestamp in results:
+    for chat_name, latest_timestamp in finish_page(results, limit, response, "latest_timestamp", "chat_name"):
         # Format the timestamp to "Month Day, Year" format
         formatted_timestamp = latest_timestamp.strftime("%B %d, %Y")
         chat_list.append(ChatResponse(chat_name=chat_name, latest_timestamp=formatted_timestamp))
 
     return chat_list
 
+# Set a boolean flag on a document unless it is already set, True when this call set it
+async def set_document_flag(db: AsyncSession, document: Documents, flag) -> bool:
+    result = await db.execute(
+        update(Documents)
+        .where(Documents.doc_id == document.doc_id, flag.isnot(True))
+        .values({flag.key: True})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
 @app.put("/documents/mark-important/")
-async def mark_document_as_important(request: MarkImportantRequest, db: Session = Depends(get_db)):
+async def mark_document_as_important(request: MarkImportantRequest, db: AsyncSession = Depends(get_async_db)):
     # Find the document with the specified user_id and doc_url
-    document = db.query(Documents).filter(
+    document = (await db.execute(select(Documents).where(
         Documents.user_id == request.user_id,
         Documents.document_url == request.doc_url
-    ).first()
+    ))).scalars().first()
 
     # Check if the document exists
     if not document:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
 
-    # Update the is_important field to True
-    document.is_important = True
-    db.commit()
+    # Update the is_important field to True, counting it once in the user's summary: the conditional
+    # UPDATE changes the row for only one of several concurrent requests
+    if await set_document_flag(db, document, Documents.is_important):
+        await aupdate_summaries(db, summary_rows(document, important=1))
+    await db.commit()
 
     return {"message": "Document marked as important successfully"}
 
 @app.put("/documents/move-trash/")
-async def move_trash(request: MoveToTrashRequest, db: Session = Depends(get_db)):
+async def move_trash(request: MoveToTrashRequest, db: AsyncSession = Depends(get_async_db)):
     # Find the document with the specified user_id and doc_url
-    document = db.query(Documents).filter(
+    document = (await db.execute(select(Documents).where(
         Documents.user_id == request.user_id,
         Documents.document_url == request.doc_url
-    ).first()
+    ))).scalars().first()
 
     # Check if the document exists
     if not document:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
 
-    # Update the is_deleted field to True
-    document.is_deleted = True
-    db.commit()
+    # Update the is_deleted field to True, counting it once in the user's summary
+    if await set_document_flag(db, document, Documents.is_deleted):
+        await aupdate_summaries(db, summary_rows(document, deleted=1))
+    await db.commit()
 
     return {"message": "Document moved to trash"}
 
 @app.get("/user/{user_id}/category/{category_name}/documents", response_model=List[DocumentByCategoryResponse])
-async def get_documents_by_category(user_id: int, category_name: str, db: Session = Depends(get_db)):
+async def get_documents_by_category(user_id: int, category_name: str, db: AsyncSession = Depends(get_async_db)):
     # Query the documents for the specified user_id and category_name
-    documents = db.query(Documents).filter(
+    documents = (await db.execute(select(Documents).where(
         Documents.user_id == user_id,
         Documents.category_name == category_name
-    ).all()
+    ))).scalars().all()
 
     # Check if any documents are found for the category
     if not documents:
@@ -450,98 +533,92 @@ async def get_documents_by_category(user_id: int, category_name: str, db: Sessio
     return response
 
 @app.get("/user/{user_id}/important-documents", response_model=List[ImportantDocumentResponse])
-async def get_important_documents(user_id: int, db: Session = Depends(get_db)):
-    # Query the documents where is_important is True for the given user_id
-    important_docs = db.query(Documents).filter(
+async def get_important_documents(user_id: int, response: Response, cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
+    # One page of the documents where is_important is True for the given user_id, most recent first
+    documents = (await db.execute(keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(
         Documents.user_id == user_id,
         Documents.is_important == True
-    ).all()
+    ), Documents.timestamp, Documents.doc_id, cursor, limit))).all()
 
-    # Check if any important documents are found
-    if not important_docs:
+    if not documents and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No important documents found for this user")
 
     # Format the response with document URL and formatted timestamp
-    response = [
+    return [
         {
             "document_url": doc.document_url,
             "timestamp": doc.timestamp.strftime("%B %d, %Y")  # Format to "Month Day, Year"
         }
-        for doc in important_docs
+        for doc in finish_page(documents, limit, response)
     ]
 
-    return response
-
 @app.get("/user/{user_id}/trash-documents", response_model=List[ImportantDocumentResponse])
-async def get_trash_documents(user_id: int, db: Session = Depends(get_db)):
-    # Query the documents where is_important is True for the given user_id
-    important_docs = db.query(Documents).filter(
+async def get_trash_documents(user_id: int, response: Response, cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
+    # One page of the documents where is_deleted is True for the given user_id, most recent first
+    documents = (await db.execute(keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(
         Documents.user_id == user_id,
         Documents.is_deleted == True
-    ).all()
+    ), Documents.timestamp, Documents.doc_id, cursor, limit))).all()
 
-    # Check if any important documents are found
-    if not important_docs:
+    if not documents and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No important documents found for this user")
 
     # Format the response with document URL and formatted timestamp
-    response = [
+    return [
         {
             "document_url": doc.document_url,
             "timestamp": doc.timestamp.strftime("%B %d, %Y")  # Format to "Month Day, Year"
         }
-        for doc in important_docs
+        for doc in finish_page(documents, limit, response)
     ]
 
-    return response
-
 @app.post("/documents/search-by-category/")
-async def get_documents_by_category(request: DocumentQueryRequest, db: Session = Depends(get_db)):
-    # Query the documents table for documents that match the user_id and category
-    documents = db.query(Documents).filter(
+async def get_documents_by_category(request: DocumentQueryRequest, response: Response, cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
+    # One page of the documents that match the user_id and category, most recent first
+    documents = (await db.execute(keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(
         Documents.user_id == request.user_id,
         Documents.category == request.category
-    ).all()
+    ), Documents.timestamp, Documents.doc_id, cursor, limit))).all()
 
-    if not documents:
+    if not documents and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No documents found for this category")
 
-    # Prepare the response with formatted timestamps
-    document_data = [
+    # Format the response with document URL and formatted timestamp
+    return [
         {
             "document_url": doc.document_url,
-            "timestamp": doc.timestamp.strftime("%B %d, %Y")
+            "timestamp": doc.timestamp.strftime("%B %d, %Y")  # Format to "Month Day, Year"
         }
-        for doc in documents
+        for doc in finish_page(documents, limit, response)
     ]
 
-    return document_data
-
 @app.post("/documents/search-by-folder/")
-async def get_documents_by_folder(request: FolderQueryRequest, db: Session = Depends(get_db)):
-    # Query the documents table for documents that match the user_id and foldername
-    documents = db.query(Documents).filter(
+async def get_documents_by_folder(request: FolderQueryRequest, response: Response, cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_async_db)):
+    # One page of the documents that match the user_id and foldername, most recent first
+    documents = (await db.execute(keyset_page(select(Documents.document_url, Documents.timestamp, Documents.doc_id).where(
         Documents.user_id == request.user_id,
         Documents.foldername == request.foldername
-    ).all()
+    ), Documents.timestamp, Documents.doc_id, cursor, limit))).all()
 
-    if not documents:
+    if not documents and not cursor:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No documents found for this folder")
 
-    # Prepare the response with formatted timestamps
-    document_data = [
+    # Format the response with document URL and formatted timestamp
+    return [
         {
             "document_url": doc.document_url,
-            "timestamp": doc.timestamp.strftime("%B %d, %Y")
+            "timestamp": doc.timestamp.strftime("%B %d, %Y")  # Format to "Month Day, Year"
         }
-        for doc in documents
+        for doc in finish_page(documents, limit, response)
     ]
 
-    return document_data
-
 @app.post("/upload_and_initialize/")
 async def upload_and_initialize(file: UploadFile = File(...), user_id: int = Form(...),
-    query: str = Form(...),db: Session = Depends(get_db)):
+    query: str = Form(...),db: AsyncSession = Depends(get_async_db)):
     content_type = file.content_type
     file_id = str(uuid4())
     file_key = f"documents/{file_id}_{file.filename}"
@@ -550,65 +627,60 @@ async def upload_and_initialize(file: UploadFile = File(...), user_id: int = For
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type"
         )
-    file_content = await file.read()
+    check_file_sizes([file])
     try:
-        s3.upload_fileobj(BytesIO(file_content), S3_BUCKET, file_key)
-        s3.copy_object(
-                    Bucket=S3_BUCKET,
-                    CopySource={"Bucket": S3_BUCKET, "Key": file_key},
-                    Key=file_key,
-                    MetadataDirective="REPLACE",
-                    ContentDisposition="inline",
-                    ContentType=content_type,
-                )
-    except ClientError as e:
+        content_hash = await asyncio.to_thread(upload_file, file.file, file_key, content_type)
+    except FileTooLarge as e:
+        raise too_large(str(e))
+    except (ClientError, S3UploadFailedError):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail="File upload failed",)
 
-
-    doc_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_key}"
-    document_text = process_file(file_content, content_type)
-    category=classify_document_content(document_text)
-    print(category)
-    chat_name = create_chat_name(document_text, query)
-    print(chat_name)
-    if not collection_exists(chat_name):
-        handle_chat_embeddings(chat_name, document_text)
-
-    response = query_llm(chat_name, query)
-
-    
-    new_document = Documents(
-        user_id=user_id,
-        category=category,
-        is_important=False,
-        is_deleted=False,
-        document_url=doc_url,
-        chat_name=chat_name,
-        doctype=doc_type,
-        foldername=None,
-        timestamp=datetime.utcnow(),
-    )
-
-    db.add(new_document)
-    db.commit()
-    db.refresh(new_document)
-
-    new_chat = Chats(
-        chat_name=chat_name,
-        query=query,
-        response=response,
-        timestamp=datetime.utcnow(),
-        user_id=user_id
-    )
-    db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
-    return JSONResponse(content={"chat_name": chat_name, "initial_response": response})
-
+    # OCR, classification, naming, embeddings and the first answer run in the ingestion worker
+    job_id = await enqueue_job(db, user_id, INITIALIZE_CHAT, {
+        "file_key": file_key,
+        "content_type": content_type,
+        "doc_type": doc_type,
+        "content_hash": content_hash,
+        "query": query,
+    })
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"job_id": job_id, "status": "queued"})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(Jobs, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Streams stage changes of an ingestion job and its result, e.g. the initial chat answer
+    async def event_stream():
+        last_state = None
+        while True:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(Jobs, job_id)
+                state = job_status(job) if job else None
+
+            if state is None:
+                yield sse_event("Job not found", "error")
+                return
+            if state != last_state:
+                yield sse_event(json.dumps(state), "progress")
+                last_state = state
+            if state["status"] in ("completed", "failed"):
+                yield sse_event(json.dumps(state), state["status"])
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.post("/chat/")
-async def chat(chat_name: str = Form(...), user_id: int = Form(...), query: str = Form(...), db: Session = Depends(get_db)):
+async def chat(chat_name: str = Form(...), user_id: int = Form(...), query: str = Form(...), db: AsyncSession = Depends(get_async_db)):
     print(f"Received chat_name: {chat_name}, user_id: {user_id}, query: {query}")
 
     # Validate incoming data
@@ -617,10 +689,11 @@ async def chat(chat_name: str = Form(...), user_id: int = Form(...), query: str
     if not isinstance(user_id, int):
         raise HTTPException(status_code=400, detail="user_id must be an integer.")
 
-    if not collection_exists(chat_name):
+    if not await run_in_threadpool(chat_exists, chat_name, user_id):
         raise HTTPException(status_code=404, detail="Chat not initialized or chat name not found.")
 
-    response = query_llm(chat_name, query)
+    # Retrieval and the Claude call are blocking, keep them off the event loop
+    response = await run_in_threadpool(query_llm, chat_name, query, user_id)
     new_chat = Chats(
         chat_name=chat_name,
         query=query,
@@ -629,9 +702,54 @@ async def chat(chat_name: str = Form(...), user_id: int = Form(...), query: str
         user_id=user_id
     )
     db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
-    return JSONResponse(content={"response": response['result']})
+    await db.commit()
+    return JSONResponse(content={"response": response})
+
+
+# Format one server-sent event, multi-line payloads become several data lines
+def sse_event(data: str, event: str = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(chat_name: str = Form(...), user_id: int = Form(...), query: str = Form(...)):
+    if not chat_name or not query:
+        raise HTTPException(status_code=400, detail="chat_name and query are required.")
+
+    if not await run_in_threadpool(chat_exists, chat_name, user_id):
+        raise HTTPException(status_code=404, detail="Chat not initialized or chat name not found.")
+
+    # Runs in Starlette's threadpool, tokens are forwarded as soon as Claude produces them
+    def event_stream():
+        parts = []
+        try:
+            for text in query_llm_stream(chat_name, query, user_id):
+                parts.append(text)
+                yield sse_event(text, "token")
+        except Exception as e:
+            yield sse_event(str(e), "error")
+            return
+
+        response = "".join(parts).strip()
+        # The request's session is already closed once streaming starts, so persist with a fresh one
+        db = SessionLocal()
+        try:
+            db.add(Chats(
+                chat_name=chat_name,
+                query=query,
+                response=response,
+                timestamp=datetime.utcnow(),
+                user_id=user_id
+            ))
+            db.commit()
+        finally:
+            db.close()
+        yield sse_event(json.dumps({"response": response}), "done")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.post("/upload_file_to_collection/")
@@ -639,100 +757,92 @@ async def upload_files_to_chat(
     chat_name: str = Form(...),
     user_id: int = Form(...),
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not collection_exists(chat_name):
+    if not await run_in_threadpool(chat_exists, chat_name, user_id):
         raise HTTPException(status_code=404, detail="Chat collection not found.")
 
-    uploaded_files = []
+    queued_files = []
     errors = []
+    uploads = []
 
     for file in files:
         content_type = file.content_type
         file_id = str(uuid4())
         file_key = f"documents/{file_id}_{file.filename}"
         doc_type = MIME_TYPE_MAP.get(content_type)
-        content = await file.read()
 
         if not doc_type:
             errors.append({"filename": file.filename, "error": "Unsupported file type"})
             continue
+        if file.size is not None and file.size > UPLOAD_MAX_FILE_BYTES:
+            errors.append({"filename": file.filename, "error": "File too large"})
+            continue
+        uploads.append((file, file_key, content_type, doc_type))
 
-        try:
-            # Upload to S3
-            s3.upload_fileobj(BytesIO(content), S3_BUCKET, file_key)
-            s3.copy_object(
-                Bucket=S3_BUCKET,
-                CopySource={"Bucket": S3_BUCKET, "Key": file_key},
-                Key=file_key,
-                MetadataDirective="REPLACE",
-                ContentDisposition="inline",
-                ContentType=content_type,
-            )
-
-            # Generate file URL
-            doc_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_key}"
-
-            # Process file and extract text
-            document_text = process_file(content, content_type)
-
-            # Classify content and handle embeddings
-            category = classify_document_content(document_text)
-            handle_chat_embeddings(chat_name, document_text)
-
-            # Save metadata to database
-            new_document = Documents(
-                user_id=user_id,
-                category=category,
-                is_important=False,
-                is_deleted=False,
-                document_url=doc_url,
-                chat_name=chat_name,
-                doctype=doc_type,
-                foldername=None,
-                timestamp=datetime.utcnow(),
-            )
-
-            db.add(new_document)
-            db.commit()
-            db.refresh(new_document)
+    # Stream to S3 concurrently, a failed file does not hold back the others
+    results = await upload_batch([(file.file, file_key, content_type) for file, file_key, content_type, _ in uploads])
 
-            uploaded_files.append({
-                "filename": file.filename,
-                "url": doc_url,
-                "message": "Uploaded successfully",
-            })
-
-        except ClientError as e:
+    for (file, file_key, content_type, doc_type), result in zip(uploads, results):
+        if isinstance(result, FileTooLarge):
+            errors.append({"filename": file.filename, "error": "File too large"})
+            continue
+        if isinstance(result, Exception):
             errors.append({
                 "filename": file.filename,
                 "error": "File upload failed due to server error",
             })
+            continue
 
-    return JSONResponse(content={
-        "uploaded_files": uploaded_files,
+        # Text extraction, classification and embeddings run in the ingestion worker
+        job_id = await enqueue_job(db, user_id, ADD_TO_COLLECTION, {
+            "file_key": file_key,
+            "content_type": content_type,
+            "doc_type": doc_type,
+            "filename": file.filename,
+            "content_hash": result,
+            "chat_name": chat_name,
+        })
+        queued_files.append({
+            "filename": file.filename,
+            "job_id": job_id,
+            "message": "Queued for processing",
+        })
+
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={
+        "queued_files": queued_files,
         "errors": errors,
     })
 
 
+@app.get("/metrics")
+async def get_metrics():
+    # Counters are per process, ingestion workers log their own after every job
+    return {"embedding_cache": embeddings.metrics(), "answer_cache": answer_cache.metrics()}
+
+
 # Optionally, an endpoint to delete a chat collection
+# user_id is required in the shared Qdrant layout, where chat names are only unique per user
 @app.delete("/delete_chat/{chat_name}")
-def delete_chat(chat_name: str):
-    client.delete_collection(collection_name=chat_name)
+def delete_chat(chat_name: str, user_id: Optional[int] = None):
+    try:
+        delete_chat_vectors(chat_name, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": f"Chat collection '{chat_name}' deleted successfully."}
 
 @app.get("/get_chats_by_chatnames/")
-async def get_chats_by_chatname(user_id: int, chat_name: str, db: Session = Depends(get_db)):
+async def get_chats_by_chatname(user_id: int, chat_name: str, db: AsyncSession = Depends(get_async_db)):
     try:
         # Query the chats table based on chat_name and order by timestamp
-        chats = db.query(Chats).filter(
+        chats = (await db.execute(select(Chats).where(
             Chats.user_id == user_id, Chats.chat_name == chat_name
-        ).order_by(Chats.timestamp.asc()).all()
+        ).order_by(Chats.timestamp.asc()))).scalars().all()
 
         # Query the documents table based on chat_name and order by uploaded_at
-        documents = db.query(Documents).filter(
+        documents = (await db.execute(select(Documents).where(
             Documents.user_id == user_id, Documents.chat_name == chat_name
-        ).order_by(Documents.timestamp.asc()).all()
+        ).order_by(Documents.timestamp.asc()))).scalars().all()
 
         # Check if there are any chats or documents with the given chat_name
         if not chats and not documents:
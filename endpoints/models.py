@@ -1,16 +1,19 @@
-from sqlalchemy import Column, ForeignKey, String, Text, TIMESTAMP, Integer, Boolean, text
+from sqlalchemy import Column, ForeignKey, String, Text, TIMESTAMP, Integer, Boolean, Index, text
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
 from sqlalchemy.orm import relationship
 from endpoints.database import Base
 
 class Users(Base):
     __tablename__ = "users"
     user_id = Column(Integer, primary_key=True, autoincrement=True)
-    email = Column(String(100), nullable=False)
+    email = Column(String(100), nullable=False, unique=True, index=True)
     password = Column(String(100), nullable=False)
     user_type = Column(String(100), nullable=False)
 
     documents = relationship("Documents", back_populates="user", cascade="all, delete-orphan")
     chats = relationship("Chats", back_populates="user", cascade="all, delete-orphan")
+    jobs = relationship("Jobs", back_populates="user", cascade="all, delete-orphan")
+    summaries = relationship("DocumentSummaries", back_populates="user", cascade="all, delete-orphan")
 
 class Documents(Base):
     __tablename__ = "documents"
@@ -24,8 +27,27 @@ class Documents(Base):
     doctype = Column(String(255), nullable=False)
     foldername = Column(String(100), nullable=True)
     timestamp = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"))
+    original_filename = Column(String(255), nullable=True)
 
     user = relationship("Users", back_populates="documents")
+    pages = relationship("DocumentPages", back_populates="document", cascade="all, delete-orphan")
+
+    # Every listing filters by user first. The flag indexes are partial where the database
+    # supports it (PostgreSQL, SQLite), MySQL builds them over all rows
+    __table_args__ = (
+        Index("ix_documents_user_timestamp", "user_id", "timestamp"),
+        Index("ix_documents_user_category_timestamp", "user_id", "category", "timestamp"),
+        Index("ix_documents_user_folder_timestamp", "user_id", "foldername", "timestamp"),
+        Index("ix_documents_user_chat_timestamp", "user_id", "chat_name", "timestamp"),
+        Index("ix_documents_user_url", "user_id", "document_url"),
+        # Prefix search; fuzzy search uses a trigram GIN index on PostgreSQL and an ngram
+        # FULLTEXT index on MySQL, created by migration 0004 only on those databases
+        Index("ix_documents_user_filename", "user_id", "original_filename"),
+        Index("ix_documents_user_important_timestamp", "user_id", "is_important", "timestamp",
+              postgresql_where=text("is_important"), sqlite_where=text("is_important = 1")),
+        Index("ix_documents_user_deleted_timestamp", "user_id", "is_deleted", "timestamp",
+              postgresql_where=text("is_deleted"), sqlite_where=text("is_deleted = 1")),
+    )
 
 class Chats(Base):
     __tablename__ = "chats"
@@ -37,3 +59,61 @@ class Chats(Base):
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
 
     user = relationship("Users", back_populates="chats")
+
+    __table_args__ = (
+        Index("ix_chats_user_chat_timestamp", "user_id", "chat_name", "timestamp"),
+    )
+
+class Jobs(Base):
+    __tablename__ = "jobs"
+    job_id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")
+    stage = Column(String(50), nullable=True)
+    progress = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    payload = Column(Text, nullable=False)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    run_after = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"))
+    created_at = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"))
+    updated_at = Column(TIMESTAMP, server_default=text("CURRENT_TIMESTAMP"))
+
+    user = relationship("Users", back_populates="jobs")
+
+    # Workers claim the oldest due job in a status
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after", "created_at"),
+    )
+
+# Per-user document counters: one "total" row plus one row per folder and per category,
+# maintained alongside Documents when DOCUMENT_SUMMARY_TABLE is on
+class DocumentSummaries(Base):
+    __tablename__ = "document_summaries"
+    user_id = Column(Integer, ForeignKey("users.user_id"), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    value = Column(String(100), primary_key=True)
+    documents = Column(Integer, nullable=False, default=0)
+    important = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    latest_timestamp = Column(TIMESTAMP, nullable=True)
+
+    user = relationship("Users", back_populates="summaries")
+
+# Extracted text of each page of a document, kept for content search and re-indexing.
+# The full-text index depends on the database (migration 0005): a tsvector GIN index on
+# PostgreSQL, a FULLTEXT index on MySQL and an FTS5 table kept in sync by triggers on SQLite
+class DocumentPages(Base):
+    __tablename__ = "document_pages"
+    page_id = Column(Integer, primary_key=True, autoincrement=True)
+    doc_id = Column(Integer, ForeignKey("documents.doc_id"), nullable=False)
+    page_number = Column(Integer, nullable=False)
+    text = Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=False)
+
+    document = relationship("Documents", back_populates="pages")
+
+    __table_args__ = (
+        Index("ix_document_pages_doc_page", "doc_id", "page_number", unique=True),
+    )
@@ -0,0 +1,57 @@
+import base64
+import json
+import os
+from datetime import datetime
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_
+
+# Rows per page when the client does not ask, and the most a client can ask for
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# Listings keep their JSON body, the cursor of the following page travels in this header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_size(limit):
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+# Opaque cursor: the (timestamp, tie-breaker) of the last row on the page
+def encode_cursor(timestamp, key):
+    raw = json.dumps([timestamp.isoformat(), key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, key = json.loads(raw)
+        return datetime.fromisoformat(timestamp), key
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# Rows strictly after the cursor in (timestamp, key) descending order, written out instead of
+# as a row-value comparison so every backend can walk the (..., timestamp) index for it
+def after_cursor(timestamp_column, key_column, cursor):
+    timestamp, key = decode_cursor(cursor)
+    return or_(timestamp_column < timestamp, and_(timestamp_column == timestamp, key_column < key))
+
+
+# Newest first page of a statement, fetching one extra row to know whether another page follows
+def keyset_page(statement, timestamp_column, key_column, cursor, limit, having=False):
+    if cursor:
+        condition = after_cursor(timestamp_column, key_column, cursor)
+        statement = statement.having(condition) if having else statement.where(condition)
+    return statement.order_by(timestamp_column.desc(), key_column.desc()).limit(page_size(limit) + 1)
+
+
+# Trim the extra row and point the response at the next page, if there is one
+def finish_page(rows, limit, response: Response, timestamp_field="timestamp", key_field="doc_id"):
+    size = page_size(limit)
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, timestamp_field), getattr(last, key_field))
+    return rows
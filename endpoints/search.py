@@ -0,0 +1,62 @@
+import os
+from sqlalchemy import case, func, literal, or_, select
+from sqlalchemy.dialects.mysql import match
+from endpoints.models import Documents
+from endpoints.pagination import page_size
+
+# Minimum pg_trgm similarity for a fuzzy filename match on PostgreSQL
+FILENAME_MIN_SIMILARITY = float(os.getenv("FILENAME_MIN_SIMILARITY", "0.3"))
+
+# Match tiers, ranked before the fuzzy score
+EXACT = 3
+PREFIX = 2
+FUZZY = 1
+
+
+def escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Ranked filename search for one user. An exact name (with or without extension) ranks
+# first, then prefixes, then fuzzy matches by score:
+#   PostgreSQL: ILIKE and pg_trgm similarity, both served by the trigram GIN index
+#   MySQL: LIKE on the (user_id, original_filename) index, the column's case-insensitive
+#          collation makes it case-insensitive, and MATCH ... AGAINST on the ngram FULLTEXT index
+#   SQLite: LIKE prefix and substring matches, no fuzzy score
+def filename_search_query(dialect_name, user_id, name, limit, offset=0):
+    name = name.strip()
+    column = Documents.original_filename
+    pattern = escape_like(name)
+
+    if dialect_name == "postgresql":
+        exact = or_(func.lower(column) == name.lower(), column.ilike(pattern + ".%", escape="\\"))
+        prefix = column.ilike(pattern + "%", escape="\\")
+        fuzzy = column.op("%")(name)
+        score = func.similarity(column, name)
+    elif dialect_name == "mysql":
+        exact = or_(column == name, column.like(pattern + ".%", escape="\\"))
+        prefix = column.like(pattern + "%", escape="\\")
+        score = match(column, against=name).in_natural_language_mode()
+        fuzzy = score > 0
+    else:
+        exact = or_(column == name, column.like(pattern + ".%", escape="\\"))
+        prefix = column.like(pattern + "%", escape="\\")
+        fuzzy = column.like("%" + pattern + "%", escape="\\")
+        score = literal(0.0)
+
+    tier = case((exact, EXACT), (prefix, PREFIX), else_=FUZZY)
+    return (
+        select(Documents.document_url, Documents.timestamp, column.label("filename"),
+               tier.label("tier"), score.label("score"))
+        .where(Documents.user_id == user_id, or_(prefix, fuzzy))
+        .order_by(tier.desc(), score.desc(), Documents.timestamp.desc(), Documents.doc_id.desc())
+        .limit(page_size(limit))
+        .offset(offset)
+    )
+
+
+# Applies the similarity threshold of the pg_trgm % operator for this transaction
+def similarity_threshold_statement(dialect_name):
+    if dialect_name == "postgresql":
+        return select(func.set_config("pg_trgm.similarity_threshold", str(FILENAME_MIN_SIMILARITY), True))
+    return None
@@ -0,0 +1,115 @@
+import asyncio
+import boto3
+import hashlib
+import os
+import tempfile
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from dotenv import load_dotenv
+
+load_dotenv()
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_REGION = os.getenv("S3_REGION")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+# Point the client at a local S3 stand-in (moto_server, MinIO) instead of AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Files uploaded at the same time per request
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "8"))
+# Files above the threshold go up as multipart uploads, parts are sent in parallel
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+S3_PART_CONCURRENCY = int(os.getenv("S3_PART_CONCURRENCY", "4"))
+# Largest single upload accepted, larger files are rejected while streaming
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+# Downloads are kept in memory up to this size and spill to a temporary file beyond it
+DOWNLOAD_SPOOL_MAX_BYTES = int(os.getenv("DOWNLOAD_SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=S3_PART_CONCURRENCY,
+)
+
+s3 = boto3.client(
+    's3',
+    region_name=S3_REGION,
+    endpoint_url=S3_ENDPOINT_URL,
+    aws_access_key_id=S3_ACCESS_KEY,
+    aws_secret_access_key=S3_SECRET_KEY,
+    # Enough pooled connections for every file and part in flight
+    config=Config(max_pool_connections=max(10, S3_UPLOAD_CONCURRENCY * S3_PART_CONCURRENCY)),
+)
+
+# Public URL of an uploaded object
+def document_url(file_key):
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET}/{file_key}"
+    return f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{file_key}"
+
+# Original filename of an upload, keys are <prefix>/<uuid>_<filename>
+def filename_from_key(file_key):
+    return file_key.rsplit("/", 1)[-1].split("_", 1)[-1]
+
+class FileTooLarge(Exception):
+    pass
+
+# Read-only view of a file that hashes the bytes as the uploader pulls them and stops once
+# the file grows past max_bytes. It has no seek, so boto3 streams it part by part in a
+# single pass instead of measuring it first
+class HashingReader:
+    def __init__(self, fileobj, max_bytes=UPLOAD_MAX_FILE_BYTES):
+        self.fileobj = fileobj
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.fileobj.read(size)
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise FileTooLarge(f"File exceeds {self.max_bytes} bytes")
+        self.sha256.update(chunk)
+        return chunk
+
+# Upload one file with its metadata set in the same put (or multipart upload), blocking.
+# Returns the SHA-256 of the content
+def upload_file(fileobj, file_key, content_type):
+    reader = HashingReader(fileobj)
+    s3.upload_fileobj(
+        reader,
+        S3_BUCKET,
+        file_key,
+        ExtraArgs={"ContentType": content_type, "ContentDisposition": "inline"},
+        Config=TRANSFER_CONFIG,
+    )
+    return reader.sha256.hexdigest()
+
+# Upload a batch of (fileobj, file_key, content_type) concurrently off the event loop.
+# Returns one entry per upload in order: the content hash on success, the exception on failure
+async def upload_batch(uploads):
+    semaphore = asyncio.Semaphore(S3_UPLOAD_CONCURRENCY)
+
+    async def upload(fileobj, file_key, content_type):
+        async with semaphore:
+            return await asyncio.to_thread(upload_file, fileobj, file_key, content_type)
+
+    return await asyncio.gather(*(upload(*item) for item in uploads), return_exceptions=True)
+
+# Remove objects whose upload succeeded when the rest of their request failed
+def delete_files(file_keys):
+    if file_keys:
+        s3.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": [{"Key": key} for key in file_keys]})
+
+# Download an uploaded object into a spooled temporary file, used by the ingestion worker.
+# The caller closes the file, which removes it from disk
+def download_file(file_key):
+    file = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX_BYTES)
+    try:
+        s3.download_fileobj(S3_BUCKET, file_key, file, Config=TRANSFER_CONFIG)
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return file
@@ -0,0 +1,168 @@
+import argparse
+import os
+from sqlalchemy import case, delete, func, insert, literal, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from endpoints.models import Documents, DocumentSummaries
+
+# Keep per-user counts in document_summaries and serve the dashboard listings from it.
+# Off by default: the listings then aggregate the documents table with GROUP BY.
+# Run `python -m endpoints.summary --rebuild` after turning it on for an existing database
+DOCUMENT_SUMMARY_TABLE = os.getenv("DOCUMENT_SUMMARY_TABLE", "false").lower() == "true"
+
+TOTAL = "total"
+FOLDER = "folder"
+CATEGORY = "category"
+
+
+# Counter changes for one document, given as a Documents row or a dict of its columns:
+# the user's total plus its folder and category, if any
+def summary_rows(document, documents=0, important=0, deleted=0):
+    if not isinstance(document, dict):
+        document = {column: getattr(document, column) for column in ("user_id", "foldername", "category", "timestamp")}
+    rows = [(TOTAL, "")]
+    if document["foldername"]:
+        rows.append((FOLDER, document["foldername"]))
+    if document["category"]:
+        rows.append((CATEGORY, document["category"]))
+    return [{
+        "user_id": document["user_id"],
+        "dimension": dimension,
+        "value": value,
+        "documents": documents,
+        "important": important,
+        "deleted": deleted,
+        "latest_timestamp": document["timestamp"],
+    } for dimension, value in rows]
+
+
+# Sum the changes of a batch so every summary row is written once
+def merge_rows(rows):
+    merged = {}
+    for row in rows:
+        key = (row["user_id"], row["dimension"], row["value"])
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        current = merged[key]
+        for counter in ("documents", "important", "deleted"):
+            current[counter] += row[counter]
+        if row["latest_timestamp"] and (not current["latest_timestamp"] or row["latest_timestamp"] > current["latest_timestamp"]):
+            current["latest_timestamp"] = row["latest_timestamp"]
+    return list(merged.values())
+
+
+# One INSERT that adds the changes to existing summary rows or creates them, in the dialect's
+# upsert syntax so concurrent writers never lose an increment
+def increment_statement(dialect_name, rows):
+    table = DocumentSummaries.__table__
+    if dialect_name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        new = statement.inserted
+    else:
+        statement = (postgresql if dialect_name == "postgresql" else sqlite).insert(table).values(rows)
+        new = statement.excluded
+
+    # SQLite spells GREATEST as the two-argument max()
+    greatest = func.max if dialect_name == "sqlite" else func.greatest
+    updates = {
+        "documents": table.c.documents + new.documents,
+        "important": table.c.important + new.important,
+        "deleted": table.c.deleted + new.deleted,
+        "latest_timestamp": greatest(
+            func.coalesce(table.c.latest_timestamp, new.latest_timestamp),
+            func.coalesce(new.latest_timestamp, table.c.latest_timestamp),
+        ),
+    }
+    if dialect_name == "mysql":
+        return statement.on_duplicate_key_update(**updates)
+    return statement.on_conflict_do_update(index_elements=["user_id", "dimension", "value"], set_=updates)
+
+
+# Apply counter changes inside the caller's transaction, the caller commits
+def update_summaries(db, rows):
+    if DOCUMENT_SUMMARY_TABLE and rows:
+        db.execute(increment_statement(db.bind.dialect.name, merge_rows(rows)))
+
+
+async def aupdate_summaries(db, rows):
+    if DOCUMENT_SUMMARY_TABLE and rows:
+        await db.execute(increment_statement(db.bind.dialect.name, merge_rows(rows)))
+
+
+# Counts grouped by a documents column, computed from the documents table
+def aggregate_query(user_id, column=None):
+    columns = [
+        func.count().label("documents"),
+        func.sum(case((Documents.is_important == True, 1), else_=0)).label("important"),
+        func.sum(case((Documents.is_deleted == True, 1), else_=0)).label("deleted"),
+        func.max(Documents.timestamp).label("latest_timestamp"),
+    ]
+    if column is None:
+        return select(Documents.user_id, *columns).where(Documents.user_id == user_id).group_by(Documents.user_id)
+    return (select(column.label("value"), *columns)
+            .where(Documents.user_id == user_id, column.isnot(None), column != "")
+            .group_by(column).order_by(column))
+
+
+# Counts of one dimension, or the user's total row, read from the summary table
+def summary_query(user_id, dimension=TOTAL):
+    counters = [DocumentSummaries.documents, DocumentSummaries.important,
+                DocumentSummaries.deleted, DocumentSummaries.latest_timestamp]
+    if dimension == TOTAL:
+        return select(*counters).where(DocumentSummaries.user_id == user_id, DocumentSummaries.dimension == TOTAL)
+    return (select(DocumentSummaries.value, *counters)
+            .where(DocumentSummaries.user_id == user_id, DocumentSummaries.dimension == dimension,
+                   DocumentSummaries.documents > 0)
+            .order_by(DocumentSummaries.value))
+
+
+def dimension_column(dimension):
+    return Documents.foldername if dimension == FOLDER else Documents.category
+
+
+# Counts per folder or category for one user: (value, documents, important, deleted, latest_timestamp)
+async def dimension_counts(db, user_id, dimension):
+    if DOCUMENT_SUMMARY_TABLE:
+        return (await db.execute(summary_query(user_id, dimension))).all()
+    return (await db.execute(aggregate_query(user_id, dimension_column(dimension)))).all()
+
+
+# The user's totals: (documents, important, deleted, latest_timestamp), None without documents
+async def total_counts(db, user_id):
+    if DOCUMENT_SUMMARY_TABLE:
+        return (await db.execute(summary_query(user_id))).first()
+    row = (await db.execute(aggregate_query(user_id))).first()
+    return row[1:] if row else None
+
+
+# Recompute every summary row from the documents table in one transaction
+def rebuild_summaries(connection):
+    columns = ["user_id", "dimension", "value", "documents", "important", "deleted", "latest_timestamp"]
+    counters = [
+        func.count(),
+        func.sum(case((Documents.is_important == True, 1), else_=0)),
+        func.sum(case((Documents.is_deleted == True, 1), else_=0)),
+        func.max(Documents.timestamp),
+    ]
+    table = DocumentSummaries.__table__
+    connection.execute(delete(table))
+    connection.execute(insert(table).from_select(columns, select(
+        Documents.user_id, literal(TOTAL), literal(""), *counters
+    ).group_by(Documents.user_id)))
+    for dimension, column in ((FOLDER, Documents.foldername), (CATEGORY, Documents.category)):
+        connection.execute(insert(table).from_select(columns, select(
+            Documents.user_id, literal(dimension), column, *counters
+        ).where(column.isnot(None), column != "").group_by(Documents.user_id, column)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the document summary table")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all summaries from the documents table")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        from endpoints.database import engine
+
+        with engine.begin() as connection:
+            rebuild_summaries(connection)
+        print("document summaries rebuilt")
@@ -0,0 +1,119 @@
+import argparse
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from multiprocessing import Process
+from sqlalchemy import and_, or_
+from endpoints.database import SessionLocal
+from endpoints.models import Jobs
+from endpoints.jobs import run_job
+import ocr.run
+
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+# A running job whose worker stopped renewing it for this long (killed, OOM) goes back to the queue
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# How often a worker renews the lease of the job it is running
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 5
+# How often the supervisor checks for dead worker processes
+WORKER_CHECK_INTERVAL_SECONDS = float(os.getenv("WORKER_CHECK_INTERVAL_SECONDS", "5"))
+
+
+# Lock the oldest runnable job so concurrent workers never pick the same one. Running jobs
+# whose lease ran out are claimed like queued ones, or failed once out of attempts
+def claim_next_job(db):
+    while True:
+        now = datetime.utcnow()
+        job = db.query(Jobs).filter(or_(
+            and_(Jobs.status == "queued", Jobs.run_after <= now),
+            and_(Jobs.status == "running", Jobs.updated_at < now - timedelta(seconds=JOB_LEASE_SECONDS)),
+        )).order_by(Jobs.created_at.asc()).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.commit()
+            return None
+
+        if job.status == "running" and job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.error = f"Worker lost at stage '{job.stage}' on the last attempt"
+            job.updated_at = now
+            db.commit()
+            print(f"Job {job.job_id} failed permanently: {job.error}")
+            continue
+
+        job.status = "running"
+        job.attempts += 1
+        job.updated_at = now
+        db.commit()
+        return job
+
+
+# Renew the lease of a running job until stopped. A separate session, so the renewal never
+# waits on the pipeline's own transaction
+def heartbeat(job_id, stop):
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            db.query(Jobs).filter(Jobs.job_id == job_id, Jobs.status == "running").update(
+                {"updated_at": datetime.utcnow()}
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Job {job_id}: lease renewal failed: {e}")
+        finally:
+            db.close()
+
+
+def worker_loop():
+    print(f"Ingestion worker {os.getpid()} started")
+    while True:
+        db = SessionLocal()
+        job = None
+        try:
+            job = claim_next_job(db)
+            if job:
+                stop = threading.Event()
+                renewer = threading.Thread(target=heartbeat, args=(job.job_id, stop), daemon=True)
+                renewer.start()
+                try:
+                    run_job(db, job)
+                finally:
+                    stop.set()
+                    renewer.join()
+        except Exception:
+            # A database outage must not end the worker, the job's lease brings it back later
+            print(f"Ingestion worker {os.getpid()} error:\n{traceback.format_exc()}")
+            db.rollback()
+            job = None
+        finally:
+            db.close()
+        if not job:
+            time.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+
+# Keep the requested number of worker processes alive, replacing any that exit
+def supervise(processes):
+    workers = []
+    while True:
+        for worker in [worker for worker in workers if not worker.is_alive()]:
+            worker.join()
+            workers.remove(worker)
+            print(f"Ingestion worker {worker.pid} exited with code {worker.exitcode}, restarting")
+        for _ in range(processes - len(workers)):
+            worker = Process(target=worker_loop)
+            worker.start()
+            workers.append(worker)
+        time.sleep(WORKER_CHECK_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ingestion job workers")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKER_PROCESSES", "2")))
+    args = parser.parse_args()
+
+    # --processes can differ from JOB_WORKER_PROCESSES, the worker processes inherit the OCR pool
+    # size computed from the actual count
+    if not os.getenv("OCR_WORKERS"):
+        ocr.run.OCR_WORKERS = ocr.run.ocr_workers_per_process(args.processes)
+    supervise(args.processes)
@@ -0,0 +1,72 @@
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy import create_engine
+
+from alembic import context
+
+from endpoints.database import SQLALCHEMY_DATABASE_URL, Base
+from endpoints import models  # noqa: F401, registers the tables on Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Dialect-specific search structures the migrations create outside the models: the SQLite FTS5
+# table (and its shadow tables) of migration 0005 and the trigram/FULLTEXT/tsvector indexes.
+# Autogenerate and `alembic check` would otherwise propose dropping them
+MIGRATION_ONLY_TABLE_PREFIX = "document_pages_fts"
+MIGRATION_ONLY_INDEXES = {
+    "ix_documents_filename_trgm",
+    "ix_documents_filename_fulltext",
+    "ix_document_pages_tsv",
+    "ix_document_pages_fulltext",
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name.startswith(MIGRATION_ONLY_TABLE_PREFIX):
+        return False
+    if type_ == "index" and name in MIGRATION_ONLY_INDEXES:
+        return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL for DATABASE_URL's dialect without connecting."""
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run the migrations against DATABASE_URL."""
+    connectable = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite can only alter tables by copying them
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
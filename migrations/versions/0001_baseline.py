@@ -0,0 +1,86 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+The tables as models.Base.metadata.create_all used to create them. Databases created that
+way already have them, so existing tables are left alone and the revision is just recorded.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("email", sa.String(100), nullable=False),
+            sa.Column("password", sa.String(100), nullable=False),
+            sa.Column("user_type", sa.String(100), nullable=False),
+        )
+
+    if "documents" not in existing:
+        op.create_table(
+            "documents",
+            sa.Column("doc_id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+            sa.Column("category", sa.String(100), nullable=True),
+            sa.Column("is_important", sa.Boolean(), nullable=True),
+            sa.Column("is_deleted", sa.Boolean(), nullable=True),
+            sa.Column("document_url", sa.String(255), nullable=True),
+            sa.Column("chat_name", sa.String(255), nullable=True),
+            sa.Column("doctype", sa.String(255), nullable=False),
+            sa.Column("foldername", sa.String(100), nullable=True),
+            sa.Column("timestamp", sa.TIMESTAMP(), server_default=sa.text("CURRENT_TIMESTAMP")),
+        )
+
+    if "chats" not in existing:
+        op.create_table(
+            "chats",
+            sa.Column("chat_id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("chat_name", sa.String(255), nullable=False),
+            sa.Column("query", sa.Text(), nullable=False),
+            sa.Column("response", sa.Text(), nullable=False),
+            sa.Column("timestamp", sa.TIMESTAMP(), server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+        )
+
+    if "jobs" not in existing:
+        op.create_table(
+            "jobs",
+            sa.Column("job_id", sa.String(36), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), nullable=False),
+            sa.Column("kind", sa.String(50), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("stage", sa.String(50), nullable=True),
+            sa.Column("progress", sa.Integer(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=True),
+            sa.Column("max_attempts", sa.Integer(), nullable=True),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("result", sa.Text(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("run_after", sa.TIMESTAMP(), server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.text("CURRENT_TIMESTAMP")),
+            sa.Column("updated_at", sa.TIMESTAMP(), server_default=sa.text("CURRENT_TIMESTAMP")),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("jobs")
+    op.drop_table("chats")
+    op.drop_table("documents")
+    op.drop_table("users")
@@ -0,0 +1,52 @@
+"""composite and partial indexes, unique user email
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00
+
+Fails on users.email if the table already holds duplicate addresses, those have to be
+merged first.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_index("ix_documents_user_timestamp", "documents", ["user_id", "timestamp"])
+    op.create_index("ix_documents_user_category_timestamp", "documents", ["user_id", "category", "timestamp"])
+    op.create_index("ix_documents_user_folder_timestamp", "documents", ["user_id", "foldername", "timestamp"])
+    op.create_index("ix_documents_user_chat_timestamp", "documents", ["user_id", "chat_name", "timestamp"])
+    op.create_index("ix_documents_user_url", "documents", ["user_id", "document_url"])
+    op.create_index("ix_documents_user_important_timestamp", "documents", ["user_id", "is_important", "timestamp"],
+                    postgresql_where=sa.text("is_important"), sqlite_where=sa.text("is_important = 1"))
+    op.create_index("ix_documents_user_deleted_timestamp", "documents", ["user_id", "is_deleted", "timestamp"],
+                    postgresql_where=sa.text("is_deleted"), sqlite_where=sa.text("is_deleted = 1"))
+
+    op.create_index("ix_chats_user_chat_timestamp", "chats", ["user_id", "chat_name", "timestamp"])
+
+    op.create_index("ix_jobs_status_run_after", "jobs", ["status", "run_after", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_status_run_after", table_name="jobs")
+    op.drop_index("ix_chats_user_chat_timestamp", table_name="chats")
+    op.drop_index("ix_documents_user_deleted_timestamp", table_name="documents")
+    op.drop_index("ix_documents_user_important_timestamp", table_name="documents")
+    op.drop_index("ix_documents_user_url", table_name="documents")
+    op.drop_index("ix_documents_user_chat_timestamp", table_name="documents")
+    op.drop_index("ix_documents_user_folder_timestamp", table_name="documents")
+    op.drop_index("ix_documents_user_category_timestamp", table_name="documents")
+    op.drop_index("ix_documents_user_timestamp", table_name="documents")
+    op.drop_index("ix_users_email", table_name="users")
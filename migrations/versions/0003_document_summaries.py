@@ -0,0 +1,50 @@
+"""per-user document summary table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00
+
+Created and filled from the documents table whether or not DOCUMENT_SUMMARY_TABLE is on.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = """COUNT(*),
+       SUM(CASE WHEN is_important THEN 1 ELSE 0 END),
+       SUM(CASE WHEN is_deleted THEN 1 ELSE 0 END),
+       MAX(timestamp)"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "document_summaries",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.user_id"), primary_key=True),
+        sa.Column("dimension", sa.String(20), primary_key=True),
+        sa.Column("value", sa.String(100), primary_key=True),
+        sa.Column("documents", sa.Integer(), nullable=False),
+        sa.Column("important", sa.Integer(), nullable=False),
+        sa.Column("deleted", sa.Integer(), nullable=False),
+        sa.Column("latest_timestamp", sa.TIMESTAMP(), nullable=True),
+    )
+
+    columns = "user_id, dimension, value, documents, important, deleted, latest_timestamp"
+    op.execute(f"INSERT INTO document_summaries ({columns}) "
+               f"SELECT user_id, 'total', '', {COUNTERS} FROM documents GROUP BY user_id")
+    for dimension, column in (("folder", "foldername"), ("category", "category")):
+        op.execute(f"INSERT INTO document_summaries ({columns}) "
+                   f"SELECT user_id, '{dimension}', {column}, {COUNTERS} FROM documents "
+                   f"WHERE {column} IS NOT NULL AND {column} <> '' GROUP BY user_id, {column}")
+
+
+def downgrade() -> None:
+    op.drop_table("document_summaries")
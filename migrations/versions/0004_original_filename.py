@@ -0,0 +1,68 @@
+"""original filename column for filename search
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 13:00:00
+
+Existing rows are backfilled from their URLs, whose last segment is <uuid>_<filename>.
+Fuzzy search needs the pg_trgm extension on PostgreSQL; on MySQL the ngram FULLTEXT index
+follows the server's ngram_token_size (3 gives trigrams).
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("original_filename", sa.String(255), nullable=True))
+
+    connection = op.get_bind()
+    documents = sa.table("documents", sa.column("doc_id", sa.Integer), sa.column("document_url", sa.String),
+                         sa.column("original_filename", sa.String))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(documents.c.doc_id, documents.c.document_url)
+            .where(documents.c.doc_id > last_id, documents.c.document_url.isnot(None))
+            .order_by(documents.c.doc_id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            documents.update().where(documents.c.doc_id == sa.bindparam("id"))
+            .values(original_filename=sa.bindparam("filename")),
+            [{"id": doc_id, "filename": url.rsplit("/", 1)[-1].split("_", 1)[-1][:255]} for doc_id, url in rows],
+        )
+        last_id = rows[-1][0]
+
+    op.create_index("ix_documents_user_filename", "documents", ["user_id", "original_filename"])
+
+    if connection.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_documents_filename_trgm ON documents USING gin (original_filename gin_trgm_ops)")
+    elif connection.dialect.name == "mysql":
+        op.execute("CREATE FULLTEXT INDEX ix_documents_filename_fulltext ON documents (original_filename) WITH PARSER ngram")
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql":
+        op.drop_index("ix_documents_filename_trgm", table_name="documents")
+    elif connection.dialect.name == "mysql":
+        op.drop_index("ix_documents_filename_fulltext", table_name="documents")
+    op.drop_index("ix_documents_user_filename", table_name="documents")
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("original_filename")
@@ -0,0 +1,65 @@
+"""per-page document text with a full-text index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 15:00:00
+
+PostgreSQL gets a GIN index over to_tsvector(CONTENT_SEARCH_LANGUAGE, text), MySQL a FULLTEXT
+index and SQLite an external-content FTS5 table that triggers keep in sync with
+document_pages. Documents ingested before this revision have no pages until re-processed.
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONTENT_SEARCH_LANGUAGE = os.getenv("CONTENT_SEARCH_LANGUAGE", "english")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "document_pages",
+        sa.Column("page_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("doc_id", sa.Integer(), sa.ForeignKey("documents.doc_id"), nullable=False),
+        sa.Column("page_number", sa.Integer(), nullable=False),
+        sa.Column("text", sa.Text().with_variant(mysql.MEDIUMTEXT(), "mysql"), nullable=False),
+    )
+    op.create_index("ix_document_pages_doc_page", "document_pages", ["doc_id", "page_number"], unique=True)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(f"CREATE INDEX ix_document_pages_tsv ON document_pages "
+                   f"USING gin (to_tsvector('{CONTENT_SEARCH_LANGUAGE}'::regconfig, text))")
+    elif dialect == "mysql":
+        op.execute("CREATE FULLTEXT INDEX ix_document_pages_fulltext ON document_pages (text)")
+    elif dialect == "sqlite":
+        op.execute("CREATE VIRTUAL TABLE document_pages_fts USING fts5("
+                   "text, content='document_pages', content_rowid='page_id')")
+        op.execute("CREATE TRIGGER document_pages_fts_insert AFTER INSERT ON document_pages BEGIN "
+                   "INSERT INTO document_pages_fts(rowid, text) VALUES (new.page_id, new.text); END")
+        op.execute("CREATE TRIGGER document_pages_fts_delete AFTER DELETE ON document_pages BEGIN "
+                   "INSERT INTO document_pages_fts(document_pages_fts, rowid, text) "
+                   "VALUES ('delete', old.page_id, old.text); END")
+        op.execute("CREATE TRIGGER document_pages_fts_update AFTER UPDATE ON document_pages BEGIN "
+                   "INSERT INTO document_pages_fts(document_pages_fts, rowid, text) "
+                   "VALUES ('delete', old.page_id, old.text); "
+                   "INSERT INTO document_pages_fts(rowid, text) VALUES (new.page_id, new.text); END")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS document_pages_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS document_pages_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS document_pages_fts_insert")
+        op.execute("DROP TABLE IF EXISTS document_pages_fts")
+    op.drop_table("document_pages")
@@ -0,0 +1,62 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Embedded media formats Tesseract can read, vector formats like EMF/WMF are skipped
+OCR_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".gif")
+
+# Both functions take a seekable binary file, e.g. the spooled download of an upload
+def is_docx(file):
+    file.seek(0)
+    return zipfile.is_zipfile(file)
+
+def paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f"{W}t" and node.text:
+            parts.append(node.text)
+        elif node.tag == f"{W}tab":
+            parts.append("\t")
+        elif node.tag in (f"{W}br", f"{W}cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+def table_text(table):
+    rows = []
+    for row in table.iter(f"{W}tr"):
+        cells = []
+        for cell in row.findall(f"{W}tc"):
+            cells.append(" ".join(paragraph_text(p) for p in cell.findall(f"{W}p")).strip())
+        rows.append("\t".join(cells))
+    return "\n".join(rows)
+
+def block_texts(container):
+    blocks = []
+    for child in container:
+        if child.tag == f"{W}p":
+            blocks.append(paragraph_text(child))
+        elif child.tag == f"{W}tbl":
+            blocks.append(table_text(child))
+        elif child.tag == f"{W}sdt":
+            # Content controls wrap ordinary paragraphs and tables
+            content = child.find(f"{W}sdtContent")
+            if content is not None:
+                blocks.extend(block_texts(content))
+    return blocks
+
+# Function to read paragraphs and tables straight from the OOXML package,
+# returns the document text and the embedded images that still need OCR
+def extract_docx(file):
+    file.seek(0)
+    with zipfile.ZipFile(file) as package:
+        root = ET.fromstring(package.read("word/document.xml"))
+        body = root.find(f"{W}body")
+        text = "\n".join(block_texts(body)) if body is not None else ""
+
+        images = [
+            package.read(name) for name in package.namelist()
+            if name.startswith("word/media/") and name.lower().endswith(OCR_IMAGE_EXTENSIONS)
+        ]
+
+    return text, images
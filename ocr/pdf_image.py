@@ -1,24 +1,55 @@
 import pypdfium2 as pdfium
-from PIL import Image
-from io import BytesIO
+import os
 
-def convert_pdf_to_images(file_path):
-    scale = 300/72
-    pdf_file = pdfium.PdfDocument(file_path)
-    page_indices = [i for i in range(len(pdf_file))]
+# Pages whose embedded text is shorter than this are treated as scans and OCRed
+MIN_TEXT_LAYER_CHARS = int(os.getenv("MIN_TEXT_LAYER_CHARS", "25"))
+# Share of alphanumeric characters below which a text layer is considered garbage
+MIN_TEXT_LAYER_ALNUM_RATIO = float(os.getenv("MIN_TEXT_LAYER_ALNUM_RATIO", "0.5"))
 
-    renderer = pdf_file.render(
-        pdfium.PdfBitmap.to_pil,
-        page_indices=page_indices,
-        scale=scale,
-    )
+def open_pdf(file_path):
+    if isinstance(file_path, pdfium.PdfDocument):
+        return file_path
+    return pdfium.PdfDocument(file_path)
+
+def has_usable_text(text):
+    visible = "".join(text.split())
+    if len(visible) < MIN_TEXT_LAYER_CHARS:
+        return False
+    alnum = sum(1 for char in visible if char.isalnum())
+    return alnum / len(visible) >= MIN_TEXT_LAYER_ALNUM_RATIO
+
+# Function to read the embedded text of every page, None for pages that need OCR
+def extract_text_layer(file_path):
+    pdf_file = open_pdf(file_path)
+    page_texts = []
+
+    for i in range(len(pdf_file)):
+        page = pdf_file[i]
+        textpage = page.get_textpage()
+        text = textpage.get_text_range()
+        textpage.close()
+        page.close()
+        page_texts.append(text if has_usable_text(text) else None)
+
+    return page_texts
+
+# Function to render pages straight to grayscale PIL images for OCR, the bitmaps are
+# handed over as raw pixels instead of being re-encoded to JPEG and decoded again
+def convert_pdf_to_images(file_path, page_indices=None, dpi=300):
+    scale = dpi/72
+    pdf_file = open_pdf(file_path)
+    if page_indices is None:
+        page_indices = [i for i in range(len(pdf_file))]
 
     list_final_images = []
 
-    for i, image in zip(page_indices, renderer):
-        image_byte_array = BytesIO()
-        image.save(image_byte_array, format='JPEG', optimize=True)
-        image_byte_array = image_byte_array.getvalue()
-        list_final_images.append(image_byte_array)
-    
+    for i in page_indices:
+        page = pdf_file[i]
+        bitmap = page.render(scale=scale, grayscale=True)
+        image = bitmap.to_pil()
+        # The image shares the bitmap's buffer, keep the bitmap alive as long as the image
+        image.pdfium_bitmap = bitmap
+        list_final_images.append(image)
+        page.close()
+
     return list_final_images
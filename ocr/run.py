@@ -1,40 +1,178 @@
-from pytesseract import image_to_string
-from PIL import Image
+from pytesseract import image_to_string, image_to_data, Output
+from PIL import Image, UnidentifiedImageError
 from io import BytesIO
-from ocr.pdf_image import convert_pdf_to_images
-import pypandoc
+from concurrent.futures import ProcessPoolExecutor
+from ocr.pdf_image import convert_pdf_to_images, extract_text_layer, open_pdf
+from ocr.docx_text import extract_docx, is_docx
+import pypdfium2 as pdfium
+import subprocess
+import tempfile
+import shutil
+import os
 
-def convert_word_to_pdf(word_file, output_pdf='output.pdf'):
-    pypandoc.convert_file(word_file, 'pdf', outputfile=output_pdf)
+# Function to split the CPUs among the OCR pools of the ingestion worker processes, each of
+# which runs its own pool
+def ocr_workers_per_process(job_worker_processes):
+    return max(1, (os.cpu_count() or 1) // max(1, job_worker_processes))
+
+# Number of processes each ingestion worker uses to OCR pages in parallel, 1 disables the pool.
+# The host runs up to JOB_WORKER_PROCESSES x OCR_WORKERS OCR processes, so by default every
+# worker gets an equal share of the CPUs. Setting OCR_WORKERS overrides the split
+OCR_WORKERS = int(os.getenv("OCR_WORKERS") or ocr_workers_per_process(int(os.getenv("JOB_WORKER_PROCESSES", "2"))))
+# Adaptive resolution: OCR at OCR_LOW_DPI first and re-render only low confidence pages at OCR_DPI
+OCR_ADAPTIVE_DPI = os.getenv("OCR_ADAPTIVE_DPI", "false").lower() == "true"
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LOW_DPI = int(os.getenv("OCR_LOW_DPI", "150"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "70"))
+# LibreOffice converts legacy .doc files, which neither python-docx nor pandoc can read
+SOFFICE = os.getenv("SOFFICE_PATH") or shutil.which("soffice") or shutil.which("libreoffice")
+SOFFICE_TIMEOUT_SECONDS = int(os.getenv("SOFFICE_TIMEOUT_SECONDS", "120"))
+
+# A document that cannot be read on any attempt: an unsupported type or a corrupt file
+class UnsupportedDocument(ValueError):
+    pass
+
+_ocr_pool = None
+_ocr_pool_size = None
+
+# Function to get the shared OCR process pool, created on first use and reused afterwards
+def get_ocr_pool(workers):
+    global _ocr_pool, _ocr_pool_size
+    if _ocr_pool is None or _ocr_pool_size != workers:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown()
+        _ocr_pool = ProcessPoolExecutor(max_workers=workers)
+        _ocr_pool_size = workers
+    return _ocr_pool
+
+# Function to convert a legacy .doc file to a PDF next to it, the PDF takes the same base name
+def convert_word_to_pdf(word_file):
+    if not SOFFICE:
+        raise UnsupportedDocument("Legacy .doc files need LibreOffice (soffice), which is not installed")
+    out_dir = os.path.dirname(word_file)
+    # A private profile directory lets several workers run LibreOffice at the same time
+    profile = "file://" + os.path.join(out_dir, "soffice-profile")
+    subprocess.run([SOFFICE, f"-env:UserInstallation={profile}", "--headless", "--convert-to", "pdf",
+                    "--outdir", out_dir, word_file],
+                   check=True, capture_output=True, timeout=SOFFICE_TIMEOUT_SECONDS)
+    output_pdf = os.path.splitext(word_file)[0] + ".pdf"
+    if not os.path.exists(output_pdf):
+        raise UnsupportedDocument("LibreOffice could not convert the Word document")
     return output_pdf
 
-def extract_text_with_pytesseract(images):
-    image_content = []
-    for image_bytes in images:
-        image = Image.open(BytesIO(image_bytes))
-        raw_text = image_to_string(image)
-        image_content.append(raw_text)
-    return "\n".join(image_content)
+# Rendered pages arrive as PIL images, embedded pictures (e.g. from DOCX) as encoded bytes
+def load_image(image):
+    if isinstance(image, Image.Image):
+        return image
+    return Image.open(BytesIO(image))
+
+def ocr_page(image):
+    return image_to_string(load_image(image))
+
+# Function to OCR a page and return its text with the mean word confidence (0-100)
+def ocr_page_with_confidence(image):
+    data = image_to_data(load_image(image), output_type=Output.DICT)
+    lines = {}
+    confidences = []
+    for n, word in enumerate(data["text"]):
+        confidence = float(data["conf"][n])
+        if not word.strip() or confidence < 0:
+            continue
+        confidences.append(confidence)
+        line_key = (data["block_num"][n], data["par_num"][n], data["line_num"][n])
+        lines.setdefault(line_key, []).append(word)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
+
+def map_pages(func, images, workers=None):
+    workers = OCR_WORKERS if workers is None else workers
+    if workers <= 1 or len(images) <= 1:
+        return [func(image) for image in images]
+    # Pages are independent, map keeps them in their original order
+    return list(get_ocr_pool(workers).map(func, images))
+
+def ocr_pages(images, workers=None):
+    return map_pages(ocr_page, images, workers)
+
+# Function to OCR PDF pages at low resolution first, re-rendering only the pages
+# whose confidence falls below OCR_MIN_CONFIDENCE at full resolution
+def ocr_pdf_pages_adaptive(pdf_file, page_indices):
+    images = convert_pdf_to_images(pdf_file, page_indices=page_indices, dpi=OCR_LOW_DPI)
+    results = map_pages(ocr_page_with_confidence, images)
+
+    retry = [n for n, (text, confidence) in enumerate(results) if confidence < OCR_MIN_CONFIDENCE]
+    if retry:
+        images = convert_pdf_to_images(pdf_file, page_indices=[page_indices[n] for n in retry], dpi=OCR_DPI)
+        for n, result in zip(retry, map_pages(ocr_page_with_confidence, images)):
+            if result[1] >= results[n][1]:
+                results[n] = result
+
+    return [text for text, confidence in results]
+
+def extract_text_with_pytesseract(images, workers=None):
+    return "\n".join(ocr_pages(images, workers))
 
 def handle_docx(file):
-    # Save the uploaded docx file to a temporary location to convert it
-    with open("/tmp/temp_file.docx", "wb") as temp_file:
-        temp_file.write(file)
+    if is_docx(file):
+        text, images = extract_docx(file)
+        # Only pictures embedded in the document go through OCR
+        if images:
+            text = "\n".join([text] + ocr_pages(images))
+        return [text]
+
+    # Legacy .doc files are not OOXML, LibreOffice converts them in a per-request temporary directory
+    with tempfile.TemporaryDirectory() as temp_dir:
+        word_file = os.path.join(temp_dir, "document.doc")
+        file.seek(0)
+        with open(word_file, "wb") as temp_file:
+            shutil.copyfileobj(file, temp_file)
 
-    pdf_file = convert_word_to_pdf("/tmp/temp_file.docx")
-    images = convert_pdf_to_images(pdf_file)
-    return extract_text_with_pytesseract(images)
+        pdf_file = convert_word_to_pdf(word_file)
+        images = convert_pdf_to_images(pdf_file)
+        return ocr_pages(images)
 
 def handle_pdf(file):
-    images = convert_pdf_to_images(BytesIO(file))
-    return extract_text_with_pytesseract(images)
+    file.seek(0)
+    # pdfium reads the pages it needs from the file instead of a copy in memory
+    try:
+        pdf_file = open_pdf(file)
+    except pdfium.PdfiumError as e:
+        raise UnsupportedDocument(f"Unreadable PDF: {e}")
+    page_texts = extract_text_layer(pdf_file)
+
+    # Only pages without a usable text layer are rendered and OCRed
+    ocr_indices = [i for i, text in enumerate(page_texts) if text is None]
+    if ocr_indices:
+        if OCR_ADAPTIVE_DPI:
+            texts = ocr_pdf_pages_adaptive(pdf_file, ocr_indices)
+        else:
+            texts = ocr_pages(convert_pdf_to_images(pdf_file, page_indices=ocr_indices, dpi=OCR_DPI))
+        for i, text in zip(ocr_indices, texts):
+            page_texts[i] = text
+
+    return page_texts
 
 def handle_image(file):
-    image = Image.open(BytesIO(file))
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except UnidentifiedImageError as e:
+        raise UnsupportedDocument(f"Unreadable image: {e}")
     raw_text = image_to_string(image)
-    return raw_text
+    return [raw_text]
 
-def process_file(file, content_type):
+def handle_text(file):
+    file.seek(0)
+    return [file.read().decode("utf-8", errors="replace")]
+
+# Function to extract the text of a document page by page: PDF pages, or the whole text of a
+# DOCX or image as a single page. file is a seekable binary file (the worker passes a spooled
+# temporary file), bytes are wrapped
+def process_file_pages(file, content_type):
+    if isinstance(file, (bytes, bytearray)):
+        file = BytesIO(file)
 
     if content_type == 'application/pdf':
         return handle_pdf(file)
@@ -42,6 +180,10 @@ def process_file(file, content_type):
         return handle_docx(file)
     elif content_type in ['image/jpeg', 'image/png']:
         return handle_image(file)
+    elif content_type == 'text/plain':
+        return handle_text(file)
     else:
-        raise ValueError(f"Unsupported file type: {content_type}")
+        raise UnsupportedDocument(f"Unsupported file type: {content_type}")
 
+def process_file(file, content_type):
+    return "\n".join(process_file_pages(file, content_type))
@@ -0,0 +1,99 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cosine similarity above which a previous question counts as the same question
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Total answers kept across all chats, least recently used ones are evicted first
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+# Per-chat cache of (query embedding, answer) pairs. Entries remember the chat's corpus
+# version (its chunk count) when they were stored, so answers given before new documents
+# were indexed, possibly by another process, are never served
+class SemanticAnswerCache:
+    def __init__(self, threshold=ANSWER_CACHE_SIMILARITY, ttl=ANSWER_CACHE_TTL_SECONDS,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (chat_name, entry_id) -> entry, in LRU order
+        self.chats = {}  # chat_name -> set of entry keys
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def drop(self, key):
+        self.entries.pop(key, None)
+        keys = self.chats.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.chats[key[0]]
+
+    def lookup(self, chat_name, query_vector, version):
+        now = time.monotonic()
+        with self.lock:
+            best_key, best_score = None, self.threshold
+            for key in list(self.chats.get(chat_name, ())):
+                entry = self.entries[key]
+                if entry["version"] != version or now - entry["created_at"] > self.ttl:
+                    self.drop(key)
+                    self.stats["expired"] += 1
+                    continue
+                score = cosine_similarity(query_vector, entry["vector"])
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(best_key)
+            self.stats["hits"] += 1
+            return self.entries[best_key]["response"]
+
+    def store(self, chat_name, query_text, query_vector, response, version):
+        with self.lock:
+            key = (chat_name, self.next_id)
+            self.next_id += 1
+            self.entries[key] = {
+                "query": query_text,
+                "vector": query_vector,
+                "response": response,
+                "version": version,
+                "created_at": time.monotonic(),
+            }
+            self.chats.setdefault(chat_name, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                oldest = next(iter(self.entries))
+                self.drop(oldest)
+                self.stats["evictions"] += 1
+
+    # Called whenever new chunks are added to a chat
+    def invalidate(self, chat_name):
+        with self.lock:
+            for key in list(self.chats.get(chat_name, ())):
+                self.drop(key)
+            self.stats["invalidations"] += 1
+
+    def metrics(self):
+        with self.lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self.entries),
+                "hit_rate": self.stats["hits"] / total if total else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache()
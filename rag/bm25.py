@@ -0,0 +1,53 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+# Identifiers and amounts stay whole (INV-2024-0042, 1,234.56, 12/03/2024) and are indexed
+# by their parts as well, so both the exact string and its pieces match
+TOKEN = re.compile(r"[^\W_]+(?:[-/.,:][^\W_]+)*")
+SEPARATOR = re.compile(r"[-/.,:]")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN.findall(text.lower()):
+        tokens.append(token)
+        parts = SEPARATOR.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+# Okapi BM25 over a fixed list of texts, held in memory as an inverted index
+class BM25Index:
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((position, frequency))
+
+        self.size = len(self.lengths)
+        self.average_length = sum(self.lengths) / self.size if self.size else 0.0
+        self.idf = {
+            term: math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    # Returns up to k (position, score) pairs, best first
+    def search(self, query, k):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for position, frequency in postings:
+                norm = 1 - self.b + self.b * self.lengths[position] / self.average_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -1,38 +1,81 @@
 import os
+import asyncio
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
+from rag.embeddings import embeddings
+from rag.local_classifier import CentroidClassifier
+from rag.prompts import head_tail_excerpt, CLASSIFY_TOKEN_BUDGET
 
 # Load environment variables
 load_dotenv()
 client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+async_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
 VALID_CATEGORIES = [
     "Medical", "Insurance", "Finance", "Utility", "Legal", "Hotel", "Retail", "Others"
 ]
+DEFAULT_CATEGORY = "Others"
+
+# "local" tries the embedding-centroid classifier first and asks Claude only when it is
+# not confident, "llm" always asks Claude
+CATEGORY_CLASSIFIER = os.getenv("CATEGORY_CLASSIFIER", "local")
+
+local_classifier = CentroidClassifier(embeddings)
 
 def clean_and_validate_response(response_text: str) -> str:
     if not response_text:
-        return "Others"
+        return DEFAULT_CATEGORY
     cleaned = response_text.strip().split(".")[0].strip()
     for category in VALID_CATEGORIES:
         if cleaned.lower() == category.lower():
             return category
-    return "Others"
+    return DEFAULT_CATEGORY
 
-def classify_document_content(document_text: str) -> str:
-    prompt = (
+def classification_prompt(document_text: str) -> str:
+    return (
         "You are a document classifier. Classify the following document into one of these exact categories: "
         "Medical, Insurance, Finance, Utility, Legal, Hotel, Retail, Others. "
         "Respond ONLY with the category name. No extra text, punctuation, or explanation.\n\n"
-        f"{document_text}\n\n"
+        f"{head_tail_excerpt(document_text, CLASSIFY_TOKEN_BUDGET)}\n\n"
         "Category:"
     )
 
+def classify_with_llm(document_text: str) -> str:
     response = client.messages.create(
         model="claude-3-opus-20240229",
         max_tokens=10,
         temperature=0.2,
-        messages=[{"role": "user", "content": prompt}]
+        messages=[{"role": "user", "content": classification_prompt(document_text)}]
     )
 
-    return clean_and_validate_response(response.content[0].text)
\ No newline at end of file
+    return clean_and_validate_response(response.content[0].text)
+
+async def aclassify_with_llm(document_text: str) -> str:
+    response = await async_client.messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=10,
+        temperature=0.2,
+        messages=[{"role": "user", "content": classification_prompt(document_text)}]
+    )
+
+    return clean_and_validate_response(response.content[0].text)
+
+def classify_locally(document_text: str):
+    if CATEGORY_CLASSIFIER != "local" or not document_text.strip():
+        return None
+    category, confident = local_classifier.predict(document_text)
+    print(f"Local classifier: {category} (confident={confident})")
+    return category if confident else None
+
+def classify_document_content(document_text: str) -> str:
+    category = classify_locally(document_text)
+    if category:
+        return category
+    return classify_with_llm(document_text)
+
+# Same as classify_document_content, for pipelines that run other stages while Claude answers
+async def aclassify_document_content(document_text: str) -> str:
+    category = await asyncio.to_thread(classify_locally, document_text)
+    if category:
+        return category
+    return await aclassify_with_llm(document_text)
@@ -2,7 +2,8 @@ import requests
 from langchain_core.runnables import RunnableLambda
 import os
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
+from rag.prompts import head_tail_excerpt, truncate_to_budget, CHAT_NAME_TOKEN_BUDGET, QUERY_TOKEN_BUDGET
 load_dotenv()
 
 # class CustomLLMBatch(RunnableLambda):
@@ -31,23 +32,18 @@ load_dotenv()
 #     def __call__(self, query: str):
 #         return self.invoke(query)
 client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+async_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-def create_chat_name(document_content: str, user_query: str) -> str:
-    prompt = (
+def chat_name_prompt(document_content: str, user_query: str) -> str:
+    return (
         "Based on the document content and user query below, generate a concise cool chat name that is 1-3 words long. "
         "Please do not include any explanations, alternatives, or additional responses. Just provide the chat name.\n\n"
-        f"Document Content: {document_content}\n"
-        f"User Query: {user_query}\n\n"
+        f"Document Content: {head_tail_excerpt(document_content, CHAT_NAME_TOKEN_BUDGET)}\n"
+        f"User Query: {truncate_to_budget(user_query, QUERY_TOKEN_BUDGET)}\n\n"
         "Chat Name:"
     )
 
-    result = client.messages.create(
-        model="claude-3-opus-20240229",  # replace with your actual model
-        max_tokens=10,
-        temperature=0.2,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
+def parse_chat_name(result) -> str:
     print("LLM Response:", result)
 
     try:
@@ -57,6 +53,27 @@ def create_chat_name(document_content: str, user_query: str) -> str:
         print("Error in response:", result)
         return "Error: Unable to generate chat name."
 
+def create_chat_name(document_content: str, user_query: str) -> str:
+    result = client.messages.create(
+        model="claude-3-opus-20240229",  # replace with your actual model
+        max_tokens=10,
+        temperature=0.2,
+        messages=[{"role": "user", "content": chat_name_prompt(document_content, user_query)}]
+    )
+
+    return parse_chat_name(result)
+
+# Same as create_chat_name, for pipelines that run other stages while Claude answers
+async def acreate_chat_name(document_content: str, user_query: str) -> str:
+    result = await async_client.messages.create(
+        model="claude-3-opus-20240229",  # replace with your actual model
+        max_tokens=10,
+        temperature=0.2,
+        messages=[{"role": "user", "content": chat_name_prompt(document_content, user_query)}]
+    )
+
+    return parse_chat_name(result)
+
 
 # # Example usage
 # if __name__ == "__main__":
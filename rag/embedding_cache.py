@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+
+# Entries kept in the in-process LRU tier
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+# SQLite file backing the persistent tier, an empty value disables it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+
+SQLITE_MAX_PARAMS = 500
+
+
+# Embeddings wrapper that looks up vectors by a hash of (model name, text), first in an
+# in-process LRU and then in a SQLite file shared across processes, so repeated chunks
+# never reach the encoder
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying, model_name, max_items=EMBEDDING_CACHE_SIZE, path=EMBEDDING_CACHE_PATH):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_items = max_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self.path = path
+        self.db = None
+        self.db_pid = None
+
+    # SQLite connections must not cross a fork, so each worker process opens its own
+    def connection(self):
+        if not self.path:
+            return None
+        if self.db is None or self.db_pid != os.getpid():
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self.db.commit()
+            self.db_pid = os.getpid()
+        return self.db
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def load_from_disk(self, keys):
+        found = {}
+        db = self.connection()
+        if db is None:
+            return found
+        for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def save_to_disk(self, items):
+        db = self.connection()
+        if db is None or not items:
+            return
+        db.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, array("f", vector).tobytes()) for key, vector in items],
+        )
+        db.commit()
+
+    def lookup(self, texts, embed):
+        keys = [self.key(text) for text in texts]
+        vectors = {}
+
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    vectors[key] = self.memory[key]
+                    self.stats["memory_hits"] += 1
+
+            missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+            for key, vector in self.load_from_disk(missing).items():
+                vectors[key] = vector
+                self.remember(key, vector)
+                self.stats["disk_hits"] += 1
+
+        # Encode each distinct missing text once, outside the lock
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                pending.setdefault(key, text)
+        if pending:
+            computed = embed(list(pending.values()))
+            with self.lock:
+                self.stats["misses"] += len(pending)
+                for key, vector in zip(pending, computed):
+                    vectors[key] = vector
+                    self.remember(key, vector)
+                self.save_to_disk(list(zip(pending, computed)))
+
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self.lookup(texts, self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self.lookup([text], lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    def metrics(self):
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            total = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "memory_entries": len(self.memory),
+                "hit_rate": hits / total if total else 0.0,
+            }
@@ -1,24 +1,60 @@
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_community.vectorstores import Qdrant
-from rag.qdrant_utils import create_qdrant_collection, collection_exists, client
+from rag.qdrant_utils import create_qdrant_collection, collection_exists, client, ensure_shared_collection, remember_chat, chat_key, QDRANT_LAYOUT, QDRANT_SHARED_COLLECTION
+from rag.embedding_cache import CachedEmbeddings
+from rag.answer_cache import answer_cache
+import os
+import uuid
 
 model_name="sentence-transformers/all-MiniLM-L6-v2"
 
-embeddings = HuggingFaceEmbeddings(model_name=model_name, 
-                                model_kwargs={'device': 'cpu'},show_progress=True)
+# Texts per encoder forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Chunks embedded and written per Qdrant upsert request
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, int8 dynamic quantization)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
 
-# Function to store embeddings and load old ones for a chat
-def handle_chat_embeddings(chat_name, document_text=None):
+def load_embedder(backend):
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name, 
+                                model_kwargs={'device': 'cpu'},
+                                encode_kwargs={'batch_size': EMBED_BATCH_SIZE},show_progress=True)
+    if backend in ("onnx", "onnx-int8"):
+        from rag.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(model_name, quantize=backend == "onnx-int8", batch_size=EMBED_BATCH_SIZE)
+    raise ValueError(f"Unsupported embedding backend: {backend}")
+
+embedder = load_embedder(EMBEDDING_BACKEND)
+
+# Chunks seen before (in this or any other chat) are served from the cache instead of the encoder.
+# Backends produce slightly different vectors, so each gets its own cache namespace
+cache_namespace = model_name if EMBEDDING_BACKEND == "torch" else f"{model_name}@{EMBEDDING_BACKEND}"
+embeddings = CachedEmbeddings(embedder, cache_namespace)
+
+# Function to open the vector store a chat's chunks live in, creating its collection if needed
+def get_vector_store(chat_name):
+    if QDRANT_LAYOUT == "shared":
+        ensure_shared_collection()
+        return Qdrant(client=client, collection_name=QDRANT_SHARED_COLLECTION, embeddings=embeddings)
 
     # Check if the collection exists
     if collection_exists(chat_name):
         print(f"Collection '{chat_name}' exists. Loading old embeddings.")
-        vector_store = Qdrant(client=client, collection_name=chat_name, embeddings=embeddings)
     else:
         print(f"Creating new collection for chat '{chat_name}'")
         create_qdrant_collection(chat_name)
-        vector_store = Qdrant(client=client, collection_name=chat_name, embeddings=embeddings)
+    return Qdrant(client=client, collection_name=chat_name, embeddings=embeddings)
+
+# Point ids of a job's chunks, the same on every attempt so a retried job overwrites its
+# own chunks instead of adding them again
+def chunk_point_ids(job_id, count):
+    return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"job/{job_id}/{n}")) for n in range(count)]
+
+# Function to store embeddings and load old ones for a chat
+def handle_chat_embeddings(chat_name, document_text=None, user_id=None, doc_id=None, job_id=None):
+    vector_store = get_vector_store(chat_name)
     
     # If a document is uploaded, create new embeddings and add to the collection
     if document_text:
@@ -30,9 +66,17 @@ def handle_chat_embeddings(chat_name, document_text=None):
                         )
         chunks = text_splitter.split_text(document_text)
 
-        for chunk in chunks:
-            vector_store.add_texts([chunk])
+        # Ownership fields are indexed in the shared layout and kept in per-chat collections for migration
+        metadata = {"chat_name": chat_name, "user_id": user_id, "doc_id": doc_id, "job_id": job_id}
+        ids = chunk_point_ids(job_id, len(chunks)) if job_id else None
+
+        # One encoder call and one upsert per batch instead of per chunk
+        vector_store.add_texts(chunks, metadatas=[metadata] * len(chunks), ids=ids,
+                               batch_size=QDRANT_UPSERT_BATCH_SIZE)
+        remember_chat(chat_name, user_id)
+        # Answers cached for this chat may not reflect the new document
+        answer_cache.invalidate(chat_key(chat_name, user_id))
         
-        print(f"New document embeddings stored in collection '{chat_name}'")
+        print(f"New document embeddings stored for chat '{chat_name}'")
 
-    return vector_store  
\ No newline at end of file
+    return vector_store
@@ -1,51 +1,85 @@
 from anthropic import Anthropic
-from langchain_qdrant import Qdrant
 from rag.embeddings import embeddings
-from rag.qdrant_utils import client
+from rag.qdrant_utils import chat_key, chat_version
+from rag.retrieval import retrieve_chunks
+from rag.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from rag.prompts import pack_context, truncate_to_budget, ANSWER_CONTEXT_TOKEN_BUDGET, QUERY_TOKEN_BUDGET
 import os
 
 llm = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-def query_llm(chat_name, query_text):
-    vector_store = Qdrant(client=client, collection_name=chat_name, embeddings=embeddings)
-    retriever = vector_store.as_retriever()
-    docs = retriever.get_relevant_documents(query_text)
-    
-    context = "\n\n".join([doc.page_content for doc in docs])
-    full_prompt = (
+ANSWER_MODEL = "claude-3-opus-20240229"
+
+# Number of chunks retrieved per question
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+
+# Function to gather the context for a question: dense search, or dense and BM25 fused (RETRIEVAL_MODE).
+# version is the chat's chunk count when the caller already has it
+def retrieve_context(chat_name, query_vector, user_id=None, query_text="", version=None):
+    chunks = retrieve_chunks(chat_name, query_text, query_vector, RETRIEVAL_K, user_id=user_id, version=version)
+    return pack_context(chunks, ANSWER_CONTEXT_TOKEN_BUDGET)
+
+def build_answer_prompt(context, query_text):
+    return (
         "You are a knowledgeable assistant. Your responses should only be based on "
         "the context below. If the query does not match the context, respond with "
         "'Your query does not match the context!'.\n\n"
         f"Context:\n{context}\n\n"
-        f"User Query: {query_text}\n\n"
+        f"User Query: {truncate_to_budget(query_text, QUERY_TOKEN_BUDGET)}\n\n"
         "Answer:"
     )
 
+# Function to look up a previous answer to a near-identical question in this user's chat.
+# The query embedding is returned too so retrieval doesn't embed the question again
+def cached_answer(chat_name, query_text, user_id=None):
+    query_vector = embeddings.embed_query(query_text)
+    if not ANSWER_CACHE_ENABLED:
+        return query_vector, None, None
+    version = chat_version(chat_name, user_id)
+    return query_vector, version, answer_cache.lookup(chat_key(chat_name, user_id), query_vector, version)
+
+def query_llm(chat_name, query_text, user_id=None):
+    query_vector, version, cached = cached_answer(chat_name, query_text, user_id)
+    if cached is not None:
+        return cached
+
+    context = retrieve_context(chat_name, query_vector, user_id, query_text, version)
+    full_prompt = build_answer_prompt(context, query_text)
+
     result = llm.messages.create(
-        model="claude-3-opus-20240229",
+        model=ANSWER_MODEL,
         max_tokens=512,
         temperature=0.3,
         messages=[{"role": "user", "content": full_prompt}]
     )
 
-    return result.content[0].text.strip()
-
-def classify_document_content(document_text):
-    try:
-        prompt = (
-            "Classify this document into one of the following categories: "
-            "Bill, Insurance, Invoice, Tax Document, Medical Report. "
-            "Respond only with the exact category label, and do not add any punctuation or new categories. "
-            f"\n\nDocument:\n{document_text}\n\nCategory:"
-        )
-
-        result = llm.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=10,
-            temperature=0.2,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return result.content[0].text.strip()
-    except Exception as e:
-        print(f"LLM classification error: {e}")
-        return None
+    response = result.content[0].text.strip()
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.store(chat_key(chat_name, user_id), query_text, query_vector, response, version)
+    return response
+
+# Function to stream the answer as text deltas while Claude generates it,
+# llm_client lets callers substitute a fake streaming client
+def query_llm_stream(chat_name, query_text, user_id=None, llm_client=None):
+    query_vector, version, cached = cached_answer(chat_name, query_text, user_id)
+    if cached is not None:
+        yield cached
+        return
+
+    context = retrieve_context(chat_name, query_vector, user_id, query_text, version)
+    full_prompt = build_answer_prompt(context, query_text)
+
+    parts = []
+    with (llm_client or llm).messages.stream(
+        model=ANSWER_MODEL,
+        max_tokens=512,
+        temperature=0.3,
+        messages=[{"role": "user", "content": full_prompt}]
+    ) as stream:
+        for text in stream.text_stream:
+            parts.append(text)
+            yield text
+
+    if ANSWER_CACHE_ENABLED:
+        answer_cache.store(chat_key(chat_name, user_id), query_text, query_vector, "".join(parts).strip(),
+                           version)
@@ -0,0 +1,77 @@
+import json
+import math
+import os
+import threading
+
+# Labelled examples per category the centroids are built from
+CATEGORY_SAMPLES_PATH = os.getenv(
+    "CATEGORY_SAMPLES_PATH", os.path.join(os.path.dirname(__file__), "data", "category_samples.json")
+)
+# Minimum gap between the best and second best centroid similarity to trust the local label
+LOCAL_CLASSIFIER_MIN_MARGIN = float(os.getenv("LOCAL_CLASSIFIER_MIN_MARGIN", "0.05"))
+# Minimum similarity to the best centroid to trust the local label
+LOCAL_CLASSIFIER_MIN_SIMILARITY = float(os.getenv("LOCAL_CLASSIFIER_MIN_SIMILARITY", "0.35"))
+# MiniLM only reads ~256 word pieces per text, so the document is embedded as a few excerpts
+LOCAL_CLASSIFIER_EXCERPT_CHARS = 1000
+LOCAL_CLASSIFIER_EXCERPTS = 3
+
+
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+def mean_vector(vectors):
+    return normalize([sum(values) / len(vectors) for values in zip(*vectors)])
+
+
+def load_samples(path=CATEGORY_SAMPLES_PATH):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+# Excerpts spread over the document: the head, the middle and the tail
+def document_excerpts(document_text):
+    text = document_text.strip()
+    size = LOCAL_CLASSIFIER_EXCERPT_CHARS
+    if len(text) <= size * LOCAL_CLASSIFIER_EXCERPTS:
+        return [text[start:start + size] for start in range(0, len(text), size)] or [""]
+    step = (len(text) - size) // (LOCAL_CLASSIFIER_EXCERPTS - 1)
+    return [text[n * step:n * step + size] for n in range(LOCAL_CLASSIFIER_EXCERPTS)]
+
+
+# Nearest-centroid classifier over the existing MiniLM embeddings. Each category's centroid
+# is the normalised mean of its sample embeddings, a document is assigned to the most similar
+# centroid and the result is marked confident only when it clears both thresholds
+class CentroidClassifier:
+    def __init__(self, embeddings, samples=None):
+        self.embeddings = embeddings
+        self.samples = samples
+        self.centroids = None
+        self.lock = threading.Lock()
+
+    def fit(self):
+        samples = self.samples if self.samples is not None else load_samples()
+        vectors = self.embeddings.embed_documents([sample["text"] for sample in samples])
+        by_category = {}
+        for sample, vector in zip(samples, vectors):
+            by_category.setdefault(sample["category"], []).append(normalize(vector))
+        self.centroids = {category: mean_vector(vectors) for category, vectors in by_category.items()}
+
+    def scores(self, document_text):
+        with self.lock:
+            if self.centroids is None:
+                self.fit()
+        vector = mean_vector([normalize(v) for v in self.embeddings.embed_documents(document_excerpts(document_text))])
+        return {
+            category: sum(x * y for x, y in zip(vector, centroid))
+            for category, centroid in self.centroids.items()
+        }
+
+    # Returns (category, confident)
+    def predict(self, document_text):
+        ranked = sorted(self.scores(document_text).items(), key=lambda item: item[1], reverse=True)
+        best_category, best_score = ranked[0]
+        margin = best_score - ranked[1][1] if len(ranked) > 1 else best_score
+        confident = best_score >= LOCAL_CLASSIFIER_MIN_SIMILARITY and margin >= LOCAL_CLASSIFIER_MIN_MARGIN
+        return best_category, confident
@@ -0,0 +1,110 @@
+import argparse
+from qdrant_client.http import models
+from rag.qdrant_utils import client, ensure_shared_collection, invalidate_collection, QDRANT_SHARED_COLLECTION
+
+# Move per-chat collections into the shared multi-tenant collection.
+# Usage: python -m rag.migrate_shared_collection [--collections a b] [--delete-source]
+
+
+# Users of each chat name according to the documents and chats tables, chunks written before
+# the shared layout existed carry no user_id in their payload. Chat names are only unique per
+# user, so a name can map to several users
+def load_chat_owners():
+    from endpoints.database import SessionLocal
+    from endpoints.models import Documents, Chats
+
+    db = SessionLocal()
+    try:
+        owners = {}
+        for model in (Documents, Chats):
+            rows = db.query(model.user_id, model.chat_name).filter(model.chat_name != None).distinct().all()
+            for user_id, chat_name in rows:
+                owners.setdefault(chat_name, set()).add(user_id)
+        return owners
+    finally:
+        db.close()
+
+
+# Why a collection cannot be migrated, or None. Points without a user_id need the chat to
+# have exactly one owner, otherwise they would land unreachable or with the wrong user
+def unmigratable_reason(chat_name, owners):
+    users = owners.get(chat_name, set())
+    if len(users) == 1:
+        return None
+    unowned = client.count(
+        collection_name=chat_name,
+        count_filter=models.Filter(must=[models.IsEmptyCondition(is_empty=models.PayloadField(key="metadata.user_id"))]),
+        exact=True,
+    ).count
+    if not unowned:
+        return None
+    if not users:
+        return f"{unowned} points without a user_id and no owner in the database"
+    return f"{unowned} points without a user_id and several owners: {sorted(users)}"
+
+
+def migrate_collection(chat_name, owners, batch_size=256):
+    users = owners.get(chat_name, set())
+    owner = next(iter(users)) if len(users) == 1 else None
+    migrated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=chat_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if points:
+            upserts = []
+            for point in points:
+                payload = dict(point.payload or {})
+                metadata = dict(payload.get("metadata") or {})
+                metadata["chat_name"] = chat_name
+                if metadata.get("user_id") is None:
+                    metadata["user_id"] = owner
+                metadata.setdefault("doc_id", None)
+                payload["metadata"] = metadata
+                upserts.append(models.PointStruct(id=point.id, vector=point.vector, payload=payload))
+            client.upsert(collection_name=QDRANT_SHARED_COLLECTION, points=upserts)
+            migrated += len(upserts)
+        if offset is None:
+            return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate per-chat Qdrant collections into the shared collection")
+    parser.add_argument("--collections", nargs="*", help="Collections to migrate, defaults to all")
+    parser.add_argument("--delete-source", action="store_true",
+                        help="Drop the migrated collections, only once every collection was migrated")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    ensure_shared_collection()
+    owners = load_chat_owners()
+    names = args.collections or [
+        collection.name for collection in client.get_collections().collections
+        if collection.name != QDRANT_SHARED_COLLECTION
+    ]
+
+    skipped = {}
+    for name in names:
+        reason = unmigratable_reason(name, owners)
+        if reason:
+            skipped[name] = reason
+            print(f"Skipped '{name}': {reason}")
+            continue
+        count = migrate_collection(name, owners, args.batch_size)
+        print(f"Migrated {count} points from '{name}'")
+
+    if skipped:
+        print(f"{len(skipped)} of {len(names)} collections were not migrated, assign their chunks an owner first")
+    if args.delete_source:
+        if skipped:
+            print("Not deleting any source collection while some are unmigrated")
+            raise SystemExit(1)
+        for name in names:
+            client.delete_collection(collection_name=name)
+            invalidate_collection(name)
+            print(f"Deleted collection '{name}'")
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+from langchain_core.embeddings import Embeddings
+
+# Directory holding exported (and quantized) ONNX models
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "onnx_models")
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+EMBED_MAX_LENGTH = int(os.getenv("EMBED_MAX_LENGTH", "256"))
+
+
+# Function to export the transformer to ONNX once and optionally quantize its weights to int8
+def export_onnx_model(model_name, quantize=False, model_dir=EMBEDDING_ONNX_DIR):
+    target_dir = os.path.join(model_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    int8_path = os.path.join(target_dir, "model-int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel
+
+        os.makedirs(target_dir, exist_ok=True)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        sample = AutoTokenizer.from_pretrained(model_name)(["export"], return_tensors="pt")
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+        print(f"Exported '{model_name}' to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized '{model_name}' to {int8_path}")
+
+    return int8_path
+
+
+# Sentence-transformer embeddings computed with ONNX Runtime on CPU, mean pooled and
+# L2 normalised like the all-MiniLM-L6-v2 sentence-transformers pipeline
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_name, quantize=False, batch_size=64, model_dir=EMBEDDING_ONNX_DIR):
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            export_onnx_model(model_name, quantize, model_dir),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=EMBED_MAX_LENGTH,
+                return_tensors="np",
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts))
+
+    def embed_query(self, text):
+        return self.encode([text])[0]
@@ -0,0 +1,88 @@
+import os
+import re
+
+# Per-task input budgets in estimated tokens
+CLASSIFY_TOKEN_BUDGET = int(os.getenv("CLASSIFY_TOKEN_BUDGET", "1500"))
+CHAT_NAME_TOKEN_BUDGET = int(os.getenv("CHAT_NAME_TOKEN_BUDGET", "800"))
+ANSWER_CONTEXT_TOKEN_BUDGET = int(os.getenv("ANSWER_CONTEXT_TOKEN_BUDGET", "6000"))
+QUERY_TOKEN_BUDGET = int(os.getenv("QUERY_TOKEN_BUDGET", "300"))
+
+# Claude averages roughly four characters per token on English prose; OCR output with many
+# numbers and symbols runs denser, which the piece count below accounts for
+CHARS_PER_TOKEN = 4
+# Letter runs, digit runs and single symbols. Every symbol is a token of its own, digits are
+# split into groups of up to three and long words into several tokens
+TEXT_PIECE = re.compile(r"([^\W\d_]+)|(\d+)|[^\w\s]|_")
+LETTERS_PER_TOKEN = 5
+DIGITS_PER_TOKEN = 3
+
+ELISION = "\n[...]\n"
+
+
+# Function to estimate the token count of a text without calling a tokenizer
+def estimate_tokens(text):
+    if not text:
+        return 0
+    by_chars = len(text) / CHARS_PER_TOKEN
+    # Counting words is O(n) too, only worth it when the character estimate is near a budget
+    if by_chars > 50000:
+        return int(by_chars)
+    by_pieces = 0
+    for letters, digits in TEXT_PIECE.findall(text):
+        if letters:
+            by_pieces += -(-len(letters) // LETTERS_PER_TOKEN)
+        elif digits:
+            by_pieces += -(-len(digits) // DIGITS_PER_TOKEN)
+        else:
+            by_pieces += 1
+    return int(max(by_chars, by_pieces))
+
+
+# Cut text from the start to at most budget tokens, preferring a whitespace boundary
+def truncate_to_budget(text, budget):
+    if estimate_tokens(text) <= budget:
+        return text
+    limit = budget * CHARS_PER_TOKEN
+    while limit > 0:
+        cut = text[:limit]
+        space = cut.rfind(" ", int(limit * 0.9))
+        if space > 0:
+            cut = cut[:space]
+        if estimate_tokens(cut) <= budget:
+            return cut
+        limit = int(limit * 0.9)
+    return ""
+
+
+# Same as truncate_to_budget, keeping the end of the text instead
+def truncate_tail_to_budget(text, budget):
+    reversed_text = text[::-1]
+    return truncate_to_budget(reversed_text, budget)[::-1]
+
+
+# Function to bound a document for classification and naming: the head carries titles and
+# letterheads, the tail carries totals and signatures
+def head_tail_excerpt(text, budget, head_share=0.7):
+    if estimate_tokens(text) <= budget:
+        return text
+    head_budget = int(budget * head_share)
+    tail_budget = budget - head_budget - estimate_tokens(ELISION)
+    return truncate_to_budget(text, head_budget) + ELISION + truncate_tail_to_budget(text, tail_budget)
+
+
+# Function to pack retrieved passages, best scored first, until the budget is used up
+def pack_context(scored_passages, budget, separator="\n\n"):
+    packed = []
+    used = 0
+    separator_tokens = estimate_tokens(separator)
+    for passage, score in sorted(scored_passages, key=lambda item: item[1], reverse=True):
+        cost = estimate_tokens(passage) + (separator_tokens if packed else 0)
+        if used + cost > budget:
+            if not packed:
+                # Never return an empty context because the best passage alone is too long
+                packed.append(truncate_to_budget(passage, budget))
+                break
+            continue
+        packed.append(passage)
+        used += cost
+    return separator.join(packed)
@@ -1,28 +1,173 @@
 import qdrant_client
 from qdrant_client.http import models
 from dotenv import load_dotenv
+import threading
+import time
 import os
 
 load_dotenv()
-# Initialize Qdrant client
+# Initialize Qdrant client, QDRANT_HOST=":memory:" runs the local in-process client for offline use
 client = qdrant_client.QdrantClient(
     os.getenv("QDRANT_HOST"),
     api_key=os.getenv("QDRANT_API_KEY")
 )
 
+VECTOR_SIZE = 384
+
+# "per_chat" keeps one collection per chat, "shared" stores every chat's chunks in one
+# collection and tells them apart by payload-indexed user_id, chat_name and doc_id fields
+QDRANT_LAYOUT = os.getenv("QDRANT_LAYOUT", "per_chat")
+QDRANT_SHARED_COLLECTION = os.getenv("QDRANT_SHARED_COLLECTION", "dms_chunks")
+
+# How long a known collection is trusted before Qdrant is asked again
+COLLECTION_CACHE_TTL_SECONDS = float(os.getenv("COLLECTION_CACHE_TTL_SECONDS", "300"))
+# Misses expire sooner, collections are created by the ingestion workers in other processes
+COLLECTION_MISS_TTL_SECONDS = float(os.getenv("COLLECTION_MISS_TTL_SECONDS", "0"))
+
+# Local registry of collection (or shared-layout chat) name -> (exists, checked_at)
+_collection_registry = {}
+_registry_lock = threading.Lock()
+
+def remember_collection(chat_name, exists):
+    with _registry_lock:
+        _collection_registry[chat_name] = (exists, time.monotonic())
+
+def invalidate_collection(chat_name=None):
+    with _registry_lock:
+        if chat_name is None:
+            _collection_registry.clear()
+        else:
+            _collection_registry.pop(chat_name, None)
+
+def cached_lookup(key, check):
+    with _registry_lock:
+        entry = _collection_registry.get(key)
+    if entry:
+        exists, checked_at = entry
+        ttl = COLLECTION_CACHE_TTL_SECONDS if exists else COLLECTION_MISS_TTL_SECONDS
+        if time.monotonic() - checked_at < ttl:
+            return exists
+
+    exists = check()
+    remember_collection(key, exists)
+    return exists
+
 # Function to create a new collection in Qdrant using chat name
 def create_qdrant_collection(chat_name):
-    vectors_config = models.VectorParams(size=384, distance=models.Distance.COSINE)
+    vectors_config = models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE)
     client.create_collection(
         collection_name=chat_name,
         vectors_config=vectors_config,
     )
+    remember_collection(chat_name, True)
     print(f"Collection '{chat_name}' created successfully.")
 
-# Function to check if a collection exists
+def delete_qdrant_collection(chat_name):
+    client.delete_collection(collection_name=chat_name)
+    remember_collection(chat_name, False)
+
+# Function to check if a collection exists, served from the registry while the entry is fresh
+# and otherwise with a single direct lookup instead of listing every collection
 def collection_exists(chat_name):
-    collections = client.get_collections()
-    for collection in collections.collections:
-        if collection.name == chat_name:
-            return True
-    return False
\ No newline at end of file
+    return cached_lookup(chat_name, lambda: client.collection_exists(collection_name=chat_name))
+
+# Function to create the shared multi-tenant collection and its payload indexes
+def ensure_shared_collection():
+    if collection_exists(QDRANT_SHARED_COLLECTION):
+        return
+    create_qdrant_collection(QDRANT_SHARED_COLLECTION)
+    for field_name, schema in [
+        ("metadata.user_id", models.PayloadSchemaType.INTEGER),
+        ("metadata.chat_name", models.PayloadSchemaType.KEYWORD),
+        ("metadata.doc_id", models.PayloadSchemaType.INTEGER),
+    ]:
+        client.create_payload_index(
+            collection_name=QDRANT_SHARED_COLLECTION,
+            field_name=field_name,
+            field_schema=schema,
+        )
+
+# Payload filter selecting one chat's chunks in the shared collection
+def chat_filter(chat_name, user_id=None):
+    must = [models.FieldCondition(key="metadata.chat_name", match=models.MatchValue(value=chat_name))]
+    if user_id is not None:
+        must.append(models.FieldCondition(key="metadata.user_id", match=models.MatchValue(value=user_id)))
+    return models.Filter(must=must)
+
+# Chat names are generated per user and only unique per user, so in the shared collection a
+# chat is always addressed together with its owner
+def owned_chat_filter(chat_name, user_id):
+    if user_id is None:
+        raise ValueError("user_id is required to address a chat in the shared Qdrant layout")
+    return chat_filter(chat_name, user_id)
+
+# Collection holding a chat's chunks under the configured layout
+def chat_collection_name(chat_name):
+    return QDRANT_SHARED_COLLECTION if QDRANT_LAYOUT == "shared" else chat_name
+
+# Key of a chat in the shared layout's registry entries and in the per-chat caches
+def chat_key(chat_name, user_id=None):
+    return (chat_name, user_id if QDRANT_LAYOUT == "shared" else None)
+
+def shared_registry_key(chat_name, user_id):
+    return f"{QDRANT_SHARED_COLLECTION}/{user_id}/{chat_name}"
+
+# Function to check if a user's chat has been indexed, whichever layout is in use. Per-chat
+# collections are named after the chat alone, so user_id only matters in the shared layout
+def chat_exists(chat_name, user_id=None):
+    if QDRANT_LAYOUT != "shared":
+        return collection_exists(chat_name)
+
+    count_filter = owned_chat_filter(chat_name, user_id)
+
+    def check():
+        if not client.collection_exists(collection_name=QDRANT_SHARED_COLLECTION):
+            return False
+        result = client.count(
+            collection_name=QDRANT_SHARED_COLLECTION,
+            count_filter=count_filter,
+            exact=False,
+        )
+        return result.count > 0
+
+    return cached_lookup(shared_registry_key(chat_name, user_id), check)
+
+# Number of chunks indexed for a chat, it changes whenever documents are added to the chat
+def chat_version(chat_name, user_id=None):
+    if QDRANT_LAYOUT == "shared":
+        return client.count(
+            collection_name=QDRANT_SHARED_COLLECTION,
+            count_filter=owned_chat_filter(chat_name, user_id),
+            exact=True,
+        ).count
+    return client.count(collection_name=chat_name, exact=True).count
+
+def remember_chat(chat_name, user_id=None):
+    if QDRANT_LAYOUT == "shared":
+        remember_collection(shared_registry_key(chat_name, user_id), True)
+
+# Stamp the document id on the chunks an ingestion job indexed, once the document row exists
+def assign_document(chat_name, user_id, job_id, doc_id):
+    job_condition = models.FieldCondition(key="metadata.job_id", match=models.MatchValue(value=job_id))
+    if QDRANT_LAYOUT == "shared":
+        selector = owned_chat_filter(chat_name, user_id)
+        selector.must.append(job_condition)
+    else:
+        selector = models.Filter(must=[job_condition])
+    client.set_payload(
+        collection_name=chat_collection_name(chat_name),
+        payload={"doc_id": doc_id},
+        points=selector,
+        key="metadata",
+    )
+
+# Function to delete a user's chat vectors, whichever layout is in use
+def delete_chat_vectors(chat_name, user_id=None):
+    if QDRANT_LAYOUT != "shared":
+        delete_qdrant_collection(chat_name)
+        return
+    client.delete(
+        collection_name=QDRANT_SHARED_COLLECTION,
+        points_selector=models.FilterSelector(filter=owned_chat_filter(chat_name, user_id)),
+    )
+    remember_collection(shared_registry_key(chat_name, user_id), False)
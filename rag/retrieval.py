@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+from langchain_qdrant import Qdrant
+from rag.bm25 import BM25Index
+from rag.embeddings import embeddings
+from rag.qdrant_utils import client, chat_collection_name, chat_key, chat_version, owned_chat_filter, QDRANT_LAYOUT
+
+# "hybrid" fuses BM25 over the chat's chunks with the dense Qdrant search, "dense" uses Qdrant only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each ranking before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Reciprocal rank fusion constant, larger values flatten the advantage of the top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Chats whose BM25 index is kept in memory per process
+LEXICAL_INDEX_CACHE_SIZE = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "64"))
+SCROLL_BATCH_SIZE = 256
+
+# chat_key(chat_name, user_id) -> (version, point ids, texts, BM25Index), least recently used first.
+# Per user in the shared layout, per collection in the per-chat layout
+_lexical_indexes = OrderedDict()
+_lexical_lock = threading.Lock()
+
+
+# Only the user's own chunks in the shared layout, a per-chat collection holds just the chat
+def search_filter(chat_name, user_id=None):
+    return owned_chat_filter(chat_name, user_id) if QDRANT_LAYOUT == "shared" else None
+
+
+# All chunks of a chat as (point id, text), read from Qdrant without their vectors
+def chat_chunks(chat_name, user_id=None):
+    chunks = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=chat_collection_name(chat_name),
+            scroll_filter=search_filter(chat_name, user_id),
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=["page_content"],
+            with_vectors=False,
+        )
+        chunks.extend((point.id, point.payload.get("page_content", "")) for point in points)
+        if offset is None:
+            return chunks
+
+
+# BM25 index of a chat, rebuilt when the chat's chunk count (its version) changes, so
+# documents added by the ingestion workers show up on the next question
+def lexical_index(chat_name, user_id=None, version=None):
+    key = chat_key(chat_name, user_id)
+    version = chat_version(chat_name, user_id) if version is None else version
+    with _lexical_lock:
+        entry = _lexical_indexes.get(key)
+        if entry and entry[0] == version:
+            _lexical_indexes.move_to_end(key)
+            return entry
+
+    chunks = chat_chunks(chat_name, user_id)
+    ids = [point_id for point_id, _ in chunks]
+    texts = [text for _, text in chunks]
+    entry = (version, ids, texts, BM25Index(texts))
+
+    with _lexical_lock:
+        _lexical_indexes[key] = entry
+        _lexical_indexes.move_to_end(key)
+        while len(_lexical_indexes) > LEXICAL_INDEX_CACHE_SIZE:
+            _lexical_indexes.popitem(last=False)
+    return entry
+
+
+# Reciprocal rank fusion: every ranking adds 1 / (k + rank) to the items it contains.
+# Returns (item, fused score) pairs, best first
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+
+
+# Dense candidates as (point id, text, score)
+def dense_search(chat_name, query_vector, user_id=None, k=RETRIEVAL_CANDIDATES):
+    vector_store = Qdrant(client=client, collection_name=chat_collection_name(chat_name), embeddings=embeddings)
+    docs = vector_store.similarity_search_with_score_by_vector(
+        query_vector, k=k, filter=search_filter(chat_name, user_id)
+    )
+    return [(doc.metadata.get("_id", doc.page_content), doc.page_content, score) for doc, score in docs]
+
+
+# Top k chunks as (text, score). In hybrid mode the dense and BM25 rankings are fused and the
+# score is the fused RRF score, in dense mode it is the Qdrant similarity
+def retrieve_chunks(chat_name, query_text, query_vector, k, user_id=None, version=None,
+                    mode=RETRIEVAL_MODE, candidates=RETRIEVAL_CANDIDATES, rrf_k=RRF_K):
+    if mode != "hybrid":
+        return [(text, score) for _, text, score in dense_search(chat_name, query_vector, user_id, k)]
+
+    dense = dense_search(chat_name, query_vector, user_id, max(k, candidates))
+    _, ids, texts, index = lexical_index(chat_name, user_id, version)
+    lexical = [(ids[position], texts[position]) for position, _ in index.search(query_text, max(k, candidates))]
+
+    text_by_id = {point_id: text for point_id, text, _ in dense}
+    text_by_id.update(lexical)
+    fused = reciprocal_rank_fusion([[point_id for point_id, _, _ in dense], [point_id for point_id, _ in lexical]], rrf_k)
+    return [(text_by_id[point_id], score) for point_id, score in fused[:k]]
@@ -0,0 +1,46 @@
+import os
+import sys
+import types
+
+# The tests run offline: the modules that load MiniLM, connect to Qdrant, call Anthropic or
+# run OCR are replaced before the app is imported. The endpoints, the SSE framing and
+# rag.llm's streaming path stay real
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def stub_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+class OfflineClient:
+    def __init__(self, *args, **kwargs):
+        self.messages = None
+
+
+class OfflineEmbeddings:
+    def embed_query(self, text):
+        return [0.0] * 384
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def metrics(self):
+        return {}
+
+
+def unavailable(*args, **kwargs):
+    raise RuntimeError("not available in the offline tests, patch it in the test")
+
+
+stub_module("anthropic", Anthropic=OfflineClient, AsyncAnthropic=OfflineClient)
+stub_module("rag.embeddings", embeddings=OfflineEmbeddings(), embedder=OfflineEmbeddings(),
+            cache_namespace="offline", handle_chat_embeddings=unavailable)
+stub_module("rag.qdrant_utils", chat_exists=unavailable, chat_version=lambda chat_name, user_id=None: 0,
+            chat_key=lambda chat_name, user_id=None: (chat_name, user_id),
+            delete_chat_vectors=unavailable, assign_document=unavailable)
+stub_module("rag.retrieval", retrieve_chunks=unavailable)
+stub_module("rag.chatname", acreate_chat_name=unavailable)
+stub_module("ocr.run", process_file_pages=unavailable, UnsupportedDocument=type("UnsupportedDocument", (ValueError,), {}))
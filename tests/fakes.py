@@ -0,0 +1,68 @@
+import time
+from contextlib import contextmanager
+
+# Stand-ins for the Anthropic streaming client and the database session, shared by the
+# streaming tests and benchmarks/sse_ttft.py
+
+
+class FakeStream:
+    def __init__(self, tokens, first_token_delay=0.0, token_delay=0.0, after_first_token=None):
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.after_first_token = after_first_token
+
+    @property
+    def text_stream(self):
+        time.sleep(self.first_token_delay)
+        for n, token in enumerate(self.tokens):
+            if n == 1 and self.after_first_token:
+                self.after_first_token()
+            if n:
+                time.sleep(self.token_delay)
+            yield token
+
+
+class FakeMessages:
+    def __init__(self, stream):
+        self.fake_stream = stream
+
+    @contextmanager
+    def stream(self, **kwargs):
+        yield self.fake_stream
+
+
+class FakeStreamingLLM:
+    def __init__(self, stream):
+        self.messages = FakeMessages(stream)
+
+
+# Keeps the rows an endpoint persists through SessionLocal instead of writing them
+class FakeSession:
+    def __init__(self):
+        self.added = []
+
+    def add(self, row):
+        self.added.append(row)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# httpx's ASGITransport hands the body over only once the app returns, so the time and content
+# of each body message are recorded between the transport and the app as (time, text)
+def recording_app(app, sent, on_body=None):
+    async def record(scope, receive, send):
+        async def recording_send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                sent.append((time.perf_counter(), message["body"].decode()))
+                if on_body:
+                    on_body(sent)
+            await send(message)
+
+        await app(scope, receive, recording_send)
+
+    return record
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+import httpx
+import rag.llm
+import endpoints.main
+from endpoints.main import app
+from tests.fakes import FakeSession, FakeStream, FakeStreamingLLM, recording_app
+
+# How long the fake model waits for the first event to leave the app before giving up
+FIRST_EVENT_TIMEOUT_SECONDS = 5
+
+
+def test_chat_stream_sends_first_event_before_the_answer_finishes(monkeypatch):
+    first_event_sent = threading.Event()
+    released = []
+    session = FakeSession()
+    sent = []
+
+    # The rest of the answer is only generated once the first event has been sent
+    stream = FakeStream(["Hello", " world"],
+                        after_first_token=lambda: released.append(first_event_sent.wait(FIRST_EVENT_TIMEOUT_SECONDS)))
+
+    def on_body(sent):
+        if "data:" in sent[0][1]:
+            first_event_sent.set()
+
+    monkeypatch.setattr(endpoints.main, "chat_exists", lambda chat_name, user_id=None: True)
+    monkeypatch.setattr(endpoints.main, "SessionLocal", lambda: session)
+    monkeypatch.setattr(rag.llm, "cached_answer", lambda *args: (None, None, None))
+    monkeypatch.setattr(rag.llm, "retrieve_context", lambda *args, **kwargs: "fixture context")
+    monkeypatch.setattr(rag.llm, "llm", FakeStreamingLLM(stream))
+
+    async def post():
+        transport = httpx.ASGITransport(app=recording_app(app, sent, on_body))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chat/stream", data={"chat_name": "chat", "user_id": 1, "query": "hi?"})
+
+    response = asyncio.run(post())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert sent[0][1] == "event: token\ndata: Hello\n\n"
+    assert released == [True]
+    assert response.text.endswith('event: done\ndata: {"response": "Hello world"}\n\n')
+    assert session.added[0].response == "Hello world"